@@ -0,0 +1,106 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+from apk_store import ApkStore
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# SHA-256 of a file, read in 1 MiB chunks so a 200 MB APK never sits in memory
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as apk_file:
+        while chunk := apk_file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """Analysis results keyed by the APK's SHA-256.
+
+    Lookups go through an in-process LRU of `capacity` entries, then the
+    normalized tables in apk_metadata.db (`apk_store.ApkStore`). Cached entries
+    leave out the file listing, which stays in apk_entries until paged in.
+    Hashing itself is skipped for files whose path, size and mtime match the
+    last time they were hashed (the apk_files table), so re-scanning an
+    unchanged collection costs one stat per APK.
+    """
+
+    def __init__(self, conn, capacity=256):
+        self.conn = conn
+        self.store = ApkStore(conn)
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.hashed = 0
+        self.hash_reused = 0
+
+    # Stored hash of `path` if its size and mtime still match, else None
+    def known_sha256(self, path, stat):
+        row = self.conn.execute(
+            'SELECT sha256 FROM apk_files WHERE path = ? AND size = ? AND mtime_ns = ?',
+            (os.path.abspath(path), stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row:
+            self.hash_reused += 1
+            return row[0]
+        return None
+
+    # SHA-256 of `path`, reusing the stored hash when the file hasn't changed
+    def sha256(self, path):
+        stat = os.stat(path)
+        sha256 = self.known_sha256(path, stat)
+        if sha256:
+            return sha256
+        sha256 = file_sha256(path)
+        self.remember(path, sha256, stat)
+        return sha256
+
+    # Record a freshly computed hash for `path`
+    def remember(self, path, sha256, stat=None):
+        stat = stat or os.stat(path)
+        self.hashed += 1
+        self.conn.execute('''
+            INSERT INTO apk_files (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET
+                size = excluded.size, mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256
+        ''', (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, sha256))
+
+    def _store(self, sha256, metadata):
+        self._entries[sha256] = metadata
+        self._entries.move_to_end(sha256)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get(self, sha256):
+        metadata = self._entries.get(sha256)
+        if metadata is not None:
+            self._entries.move_to_end(sha256)
+            self.memory_hits += 1
+            return metadata
+        apk_id = self.store.find(sha256)
+        if apk_id is None:
+            self.misses += 1
+            return None
+        self.db_hits += 1
+        metadata = self.store.load(apk_id, files=False)
+        self._store(sha256, metadata)
+        return metadata
+
+    def put(self, sha256, metadata):
+        self._store(sha256, {key: value for key, value in metadata.items() if key not in ("files", "file_infos")})
+
+    def stats(self):
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.db_hits) / lookups, 3) if lookups else None,
+            "entries": len(self._entries),
+            "hashed": self.hashed,
+            "hash_reused": self.hash_reused,
+        }
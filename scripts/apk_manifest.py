@@ -0,0 +1,224 @@
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+
+ANDROID_NS = "http://schemas.android.com/apk/res/android"
+
+# Chunk types from the Android resource format (ResourceTypes.h)
+RES_STRING_POOL_TYPE = 0x0001
+RES_XML_TYPE = 0x0003
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_END_ELEMENT_TYPE = 0x0103
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+
+UTF8_FLAG = 1 << 8
+
+# Value types of Res_value
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+TYPE_FLOAT = 0x04
+TYPE_INT_DEC = 0x10
+TYPE_INT_HEX = 0x11
+TYPE_INT_BOOLEAN = 0x12
+
+# android:* attribute resource ids, used when a (shrunk or obfuscated) manifest
+# leaves the attribute name strings empty
+ANDROID_ATTRIBUTES = {
+    0x01010003: "name",
+    0x01010006: "permission",
+    0x01010010: "exported",
+    0x0101020c: "minSdkVersion",
+    0x0101021b: "versionCode",
+    0x0101021c: "versionName",
+    0x01010270: "targetSdkVersion",
+}
+
+
+class AXMLError(ValueError):
+    pass
+
+
+def _read_length(data, offset, utf8):
+    if utf8:
+        length = data[offset]
+        if length & 0x80:
+            return ((length & 0x7f) << 8) | data[offset + 1], offset + 2
+        return length, offset + 1
+    length = struct.unpack_from('<H', data, offset)[0]
+    if length & 0x8000:
+        return ((length & 0x7fff) << 16) | struct.unpack_from('<H', data, offset + 2)[0], offset + 4
+    return length, offset + 2
+
+
+def _string_pool(data, start):
+    header_size, = struct.unpack_from('<H', data, start + 2)
+    count, _, flags, strings_start = struct.unpack_from('<IIII', data, start + 8)
+    utf8 = bool(flags & UTF8_FLAG)
+    offsets = struct.unpack_from(f'<{count}I', data, start + header_size)
+    strings = []
+    for offset in offsets:
+        position = start + strings_start + offset
+        if utf8:
+            _, position = _read_length(data, position, True)  # length in UTF-16 units
+            length, position = _read_length(data, position, True)
+            strings.append(data[position:position + length].decode('utf-8', errors='replace'))
+        else:
+            length, position = _read_length(data, position, False)
+            strings.append(data[position:position + length * 2].decode('utf-16-le', errors='replace'))
+    return strings
+
+
+def _format_value(strings, raw_index, value_type, value):
+    if raw_index != 0xffffffff and raw_index < len(strings):
+        return strings[raw_index]
+    if value_type == TYPE_STRING:
+        return strings[value] if value < len(strings) else ""
+    if value_type == TYPE_INT_DEC:
+        return str(struct.unpack('<i', struct.pack('<I', value))[0])
+    if value_type == TYPE_INT_HEX:
+        return f"0x{value:08x}"
+    if value_type == TYPE_INT_BOOLEAN:
+        return "true" if value else "false"
+    if value_type == TYPE_REFERENCE:
+        return f"@{value:08X}"
+    if value_type == TYPE_FLOAT:
+        return repr(struct.unpack('<f', struct.pack('<I', value))[0])
+    return str(value)
+
+
+# Decode Android binary XML (as stored for AndroidManifest.xml in an APK) into
+# an ElementTree element; android:* attributes use the "{ANDROID_NS}name" keys
+def parse_axml(data):
+    if len(data) < 8:
+        raise AXMLError("truncated binary XML")
+    chunk_type, header_size, total_size = struct.unpack_from('<HHI', data, 0)
+    if chunk_type != RES_XML_TYPE:
+        raise AXMLError(f"not binary XML (chunk type 0x{chunk_type:04x})")
+
+    strings = []
+    resource_ids = []
+    root = None
+    stack = []
+    offset = header_size
+    end = min(total_size, len(data))
+    while offset + 8 <= end:
+        chunk_type, header_size, size = struct.unpack_from('<HHI', data, offset)
+        if size < 8:
+            raise AXMLError(f"bad chunk size {size} at offset {offset}")
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = _string_pool(data, offset)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = struct.unpack_from(f'<{(size - header_size) // 4}I', data, offset + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            ext = offset + header_size
+            _, name, attribute_start, attribute_size, attribute_count = struct.unpack_from('<IIHHH', data, ext)
+            element = ET.Element(strings[name] if name < len(strings) else "")
+            for i in range(attribute_count):
+                position = ext + attribute_start + i * attribute_size
+                ns, attr_name, raw_index, _, _, value_type, value = struct.unpack_from('<IIIHBBI', data, position)
+                if attr_name < len(resource_ids) and resource_ids[attr_name] in ANDROID_ATTRIBUTES:
+                    key = f"{{{ANDROID_NS}}}{ANDROID_ATTRIBUTES[resource_ids[attr_name]]}"
+                else:
+                    key = strings[attr_name] if attr_name < len(strings) else ""
+                    if ns != 0xffffffff and ns < len(strings):
+                        key = f"{{{strings[ns]}}}{key}"
+                element.set(key, _format_value(strings, raw_index, value_type, value))
+            if stack:
+                stack[-1].append(element)
+            elif root is None:
+                root = element
+            stack.append(element)
+        elif chunk_type == RES_XML_END_ELEMENT_TYPE:
+            if stack:
+                stack.pop()
+        offset += size
+    if root is None:
+        raise AXMLError("no root element")
+    return root
+
+
+class ManifestAnalyzer:
+    """APK metadata from AndroidManifest.xml and the ZIP central directory only.
+
+    Same getters as `APKAnalyzer`, but nothing else in the archive is read or
+    inflated: `zipfile` lists entries from the central directory, and only the
+    manifest entry is decompressed and decoded with `parse_axml`. Component
+    names are expanded against the package the way androguard does.
+    """
+
+    def __init__(self, apk_path):
+        self.apk_path = apk_path
+        with zipfile.ZipFile(apk_path) as archive:
+            self.entries = archive.infolist()
+            self.manifest = parse_axml(archive.read("AndroidManifest.xml"))
+        self.package = self.manifest.get("package", "")
+
+    def _android(self, element, name):
+        return element.get(f"{{{ANDROID_NS}}}{name}")
+
+    def _names(self, *tags):
+        names = []
+        for tag in tags:
+            for element in self.manifest.iter(tag):
+                name = self._android(element, "name")
+                if name:
+                    names.append(self._qualify(name))
+        return list(dict.fromkeys(names))
+
+    def _qualify(self, name):
+        if name.startswith('.'):
+            return self.package + name
+        if '.' not in name:
+            return f"{self.package}.{name}"
+        return name
+
+    def get_package_name(self):
+        return self.package
+
+    def get_version(self):
+        return self._android(self.manifest, "versionName")
+
+    # android:versionCode as an int (None if missing or unparsable)
+    def get_version_code(self):
+        value = self._android(self.manifest, "versionCode")
+        try:
+            return int(value, 16) if value.startswith("0x") else int(value)
+        except (AttributeError, ValueError):
+            return None
+
+    def get_permissions(self):
+        names = (self._android(element, "name") for element in self.manifest.iter("uses-permission"))
+        return list(dict.fromkeys(name for name in names if name))
+
+    def get_activities(self):
+        return self._names("activity")
+
+    def get_services(self):
+        return self._names("service")
+
+    def get_receivers(self):
+        return self._names("receiver")
+
+    def get_providers(self):
+        return self._names("provider")
+
+    def get_files(self):
+        return [entry.filename for entry in self.entries]
+
+    # (name, uncompressed size, compressed size, CRC-32) per archive entry
+    def get_file_infos(self):
+        return [(entry.filename, entry.file_size, entry.compress_size, entry.CRC) for entry in self.entries]
+
+    def get_metadata(self):
+        return {
+            "package_name": self.get_package_name(),
+            "version": self.get_version(),
+            "version_code": self.get_version_code(),
+            "permissions": self.get_permissions(),
+            "activities": self.get_activities(),
+            "services": self.get_services(),
+            "receivers": self.get_receivers(),
+            "providers": self.get_providers(),
+            "files": self.get_files(),
+            "file_infos": self.get_file_infos(),
+        }
@@ -0,0 +1,532 @@
+import datetime
+import sqlite3
+
+from db import apply_migrations
+
+DB_NAME = "apk_metadata.db"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Component kinds as stored in apk_components.kind, keyed by metadata field
+COMPONENT_KINDS = {"activities": 0, "services": 1, "receivers": 2, "providers": 3}
+
+# Every kind of name a build is made of, as stored in apk_current.kind
+PERMISSIONS = 4
+FILES = 5
+KINDS = dict(COMPONENT_KINDS, permissions=PERMISSIONS, files=FILES)
+FIELDS = {kind: field for field, kind in KINDS.items()}
+
+# Builds stored as deltas before the next full copy; bounds how many deltas
+# reconstructing an old build replays
+KEYFRAME_INTERVAL = 20
+
+# SQLite caps host parameters per statement; stay well under it
+_CHUNK = 500
+
+
+def _add_hash_columns(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(apk_metadata)')}
+    if 'sha256' not in columns:
+        conn.execute('ALTER TABLE apk_metadata ADD COLUMN sha256 TEXT')
+    if 'size' not in columns:
+        conn.execute('ALTER TABLE apk_metadata ADD COLUMN size INTEGER')
+
+
+def _split(value):
+    return value.split(', ') if value else []
+
+
+# Move analyses stored as comma-joined apk_metadata rows into the normalized tables.
+# Written against the schema as of this step, since later steps change how
+# ApkStore.save writes.
+def _import_legacy_rows(conn):
+    store = ApkStore(conn)
+    rows = conn.execute('''
+        SELECT package_name, version, permissions, activities, services, receivers, providers, files,
+               timestamp, sha256, size
+        FROM apk_metadata ORDER BY id
+    ''')
+    for package_name, version, permissions, activities, services, receivers, providers, files, \
+            timestamp, sha256, size in rows.fetchall():
+        if sha256 and store.find(sha256):
+            continue
+        package_id, = store.intern([package_name or ""])
+        apk_id = conn.execute(
+            'INSERT INTO apks (package_id, version, sha256, size, analyzed_at) VALUES (?, ?, ?, ?, ?)',
+            (package_id, version, sha256, size, timestamp),
+        ).lastrowid
+        conn.executemany('INSERT OR IGNORE INTO apk_permissions (apk_id, permission_id) VALUES (?, ?)',
+                         [(apk_id, name_id) for name_id in store.intern(_split(permissions))])
+        for kind, names in enumerate((activities, services, receivers, providers)):
+            conn.executemany('INSERT OR IGNORE INTO apk_components (apk_id, kind, name_id) VALUES (?, ?, ?)',
+                             [(apk_id, kind, name_id) for name_id in store.intern(_split(names))])
+        conn.executemany('INSERT OR IGNORE INTO apk_entries (apk_id, name_id) VALUES (?, ?)',
+                         [(apk_id, name_id) for name_id in store.intern(_split(files))])
+
+
+# Schema history for apk_metadata.db; PRAGMA user_version tracks what has run
+MIGRATIONS = [
+    '''CREATE TABLE IF NOT EXISTS apk_metadata (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    package_name TEXT,
+                    version TEXT,
+                    permissions TEXT,
+                    activities TEXT,
+                    services TEXT,
+                    receivers TEXT,
+                    providers TEXT,
+                    files TEXT,
+                    timestamp TEXT
+                )''',
+    # Content hash of the analyzed APK, so identical files are never parsed twice,
+    # and the last known hash per path so unchanged files aren't even re-hashed
+    _add_hash_columns,
+    '''
+    CREATE INDEX IF NOT EXISTS idx_apk_metadata_sha256 ON apk_metadata (sha256);
+    CREATE TABLE IF NOT EXISTS apk_files (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        sha256 TEXT NOT NULL
+    )
+    ''',
+    # Normalized storage: every name is interned once in `strings`, and each APK
+    # links to its permissions, components and archive entries by id. The old
+    # apk_metadata table is left in place but no longer written.
+    '''
+    CREATE TABLE IF NOT EXISTS strings (
+        id INTEGER PRIMARY KEY,
+        value TEXT NOT NULL UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS apks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        package_id INTEGER NOT NULL REFERENCES strings (id),
+        version TEXT,
+        sha256 TEXT UNIQUE,
+        size INTEGER,
+        analyzed_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_apks_package ON apks (package_id, id);
+    CREATE TABLE IF NOT EXISTS apk_permissions (
+        apk_id INTEGER NOT NULL REFERENCES apks (id),
+        permission_id INTEGER NOT NULL REFERENCES strings (id),
+        PRIMARY KEY (apk_id, permission_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_apk_permissions_permission ON apk_permissions (permission_id, apk_id);
+    CREATE TABLE IF NOT EXISTS apk_components (
+        apk_id INTEGER NOT NULL REFERENCES apks (id),
+        kind INTEGER NOT NULL,
+        name_id INTEGER NOT NULL REFERENCES strings (id),
+        PRIMARY KEY (apk_id, kind, name_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_apk_components_name ON apk_components (kind, name_id, apk_id);
+    CREATE TABLE IF NOT EXISTS apk_entries (
+        apk_id INTEGER NOT NULL REFERENCES apks (id),
+        name_id INTEGER NOT NULL REFERENCES strings (id),
+        size INTEGER,
+        compressed_size INTEGER,
+        crc INTEGER,
+        PRIMARY KEY (apk_id, name_id)
+    ) WITHOUT ROWID
+    ''',
+    _import_legacy_rows,
+    # Builds of a package after the first store only what changed since the
+    # previous build: the link rows of a delta build are additions/changes, or
+    # removals with `removed` set. `base_id` is the build a delta applies to (NULL
+    # for a full copy) and `depth` counts the deltas since the last full copy.
+    # apk_current materializes the newest build of each package, whose id is in
+    # apk_heads. Everything stored so far is a full copy.
+    '''
+    ALTER TABLE apks ADD COLUMN base_id INTEGER REFERENCES apks (id);
+    ALTER TABLE apks ADD COLUMN depth INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE apk_permissions ADD COLUMN removed INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE apk_components ADD COLUMN removed INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE apk_entries ADD COLUMN removed INTEGER NOT NULL DEFAULT 0;
+    CREATE TABLE IF NOT EXISTS apk_heads (
+        package_id INTEGER PRIMARY KEY REFERENCES strings (id),
+        apk_id INTEGER NOT NULL REFERENCES apks (id)
+    );
+    CREATE TABLE IF NOT EXISTS apk_current (
+        package_id INTEGER NOT NULL REFERENCES strings (id),
+        kind INTEGER NOT NULL,
+        name_id INTEGER NOT NULL REFERENCES strings (id),
+        size INTEGER,
+        compressed_size INTEGER,
+        crc INTEGER,
+        PRIMARY KEY (package_id, kind, name_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_apk_current_name ON apk_current (kind, name_id, package_id);
+    INSERT INTO apk_heads (package_id, apk_id) SELECT package_id, MAX(id) FROM apks GROUP BY package_id;
+    INSERT INTO apk_current (package_id, kind, name_id)
+        SELECT h.package_id, 4, p.permission_id FROM apk_heads h JOIN apk_permissions p ON p.apk_id = h.apk_id;
+    INSERT INTO apk_current (package_id, kind, name_id)
+        SELECT h.package_id, c.kind, c.name_id FROM apk_heads h JOIN apk_components c ON c.apk_id = h.apk_id;
+    INSERT INTO apk_current (package_id, kind, name_id, size, compressed_size, crc)
+        SELECT h.package_id, 5, e.name_id, e.size, e.compressed_size, e.crc
+        FROM apk_heads h JOIN apk_entries e ON e.apk_id = h.apk_id
+    ''',
+    # android:versionCode, which decides the head of a package rather than the
+    # order builds happen to be saved in
+    'ALTER TABLE apks ADD COLUMN version_code INTEGER',
+]
+
+
+def connect(path=DB_NAME):
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    apply_migrations(conn, MIGRATIONS)
+    return conn
+
+
+# A build's contents as {(kind, name_id): (size, compressed size, CRC)}; the
+# three values are None for everything but files
+def metadata_state(metadata, intern):
+    state = {}
+    for field, kind in KINDS.items():
+        if kind == FILES:
+            continue
+        for name_id in intern(metadata[field]):
+            state[(kind, name_id)] = (None, None, None)
+    file_infos = metadata.get("file_infos") or [(name, None, None, None) for name in metadata["files"]]
+    for name_id, info in zip(intern([info[0] for info in file_infos]), file_infos):
+        state[(FILES, name_id)] = tuple(info[1:])
+    return state
+
+
+# Rows turning state `old` into `new`: (kind, name_id, removed, size, compressed size, CRC)
+def state_delta(old, new):
+    rows = [key + (0,) + value for key, value in new.items() if old.get(key) != value]
+    rows.extend(key + (1, None, None, None) for key in old if key not in new)
+    return rows
+
+
+class ApkStore:
+    """Normalized APK analyses in apk_metadata.db.
+
+    Package, permission, component and file names are interned in `strings`
+    (with an in-process id cache), so a name shared by every build of an APK is
+    stored once. The first build of a package is stored in full; each later
+    build stores only the permissions, components and files (by name, size and
+    CRC) that were added, changed or removed since the previous build, with a
+    full copy every `keyframe_interval` builds. The newest build of every
+    package (by version code, then by when it was saved) is materialized in
+    apk_current, so it is read, paged and searched without replaying anything;
+    older builds are rebuilt from their last full copy. A build older than the
+    current head is stored as a full copy and leaves the head alone. File
+    listings are only read when asked for, a page at a time.
+    """
+
+    def __init__(self, conn, keyframe_interval=KEYFRAME_INTERVAL):
+        self.conn = conn
+        self.keyframe_interval = keyframe_interval
+        self._ids = {}
+
+    # Ids for `values`, inserting the ones not seen before
+    def intern(self, values):
+        missing = [value for value in dict.fromkeys(values) if value not in self._ids]
+        for start in range(0, len(missing), _CHUNK):
+            chunk = missing[start:start + _CHUNK]
+            self.conn.executemany('INSERT OR IGNORE INTO strings (value) VALUES (?)', [(value,) for value in chunk])
+            placeholders = ', '.join('?' * len(chunk))
+            self._ids.update(self.conn.execute(
+                f'SELECT value, id FROM strings WHERE value IN ({placeholders})', chunk
+            ).fetchall())
+        return [self._ids[value] for value in values]
+
+    # {id: value} for interned string ids
+    def values(self, ids):
+        ids = list(set(ids))
+        values = {}
+        for start in range(0, len(ids), _CHUNK):
+            chunk = ids[start:start + _CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            values.update(self.conn.execute(f'SELECT id, value FROM strings WHERE id IN ({placeholders})', chunk))
+        return values
+
+    def find(self, sha256):
+        row = self.conn.execute('SELECT id FROM apks WHERE sha256 = ?', (sha256,)).fetchone()
+        return row[0] if row else None
+
+    def _apk(self, apk_id):
+        return self.conn.execute('''
+            SELECT a.package_id, a.version, a.base_id, h.apk_id = a.id, a.version_code
+            FROM apks a JOIN apk_heads h ON h.package_id = a.package_id
+            WHERE a.id = ?
+        ''', (apk_id,)).fetchone()
+
+    def _current(self, package_id, kinds):
+        placeholders = ', '.join('?' * len(kinds))
+        rows = self.conn.execute(f'''
+            SELECT kind, name_id, size, compressed_size, crc FROM apk_current
+            WHERE package_id = ? AND kind IN ({placeholders})
+        ''', (package_id, *kinds))
+        return {row[:2]: row[2:] for row in rows}
+
+    # Link rows stored for one build: (kind, name_id, removed, size, compressed size, CRC)
+    def _rows(self, apk_id, kinds):
+        rows = []
+        if PERMISSIONS in kinds:
+            rows.extend(self.conn.execute('''
+                SELECT 4, permission_id, removed, NULL, NULL, NULL FROM apk_permissions WHERE apk_id = ?
+            ''', (apk_id,)))
+        if any(kind in COMPONENT_KINDS.values() for kind in kinds):
+            rows.extend(row for row in self.conn.execute('''
+                SELECT kind, name_id, removed, NULL, NULL, NULL FROM apk_components WHERE apk_id = ?
+            ''', (apk_id,)) if row[0] in kinds)
+        if FILES in kinds:
+            rows.extend(self.conn.execute('''
+                SELECT 5, name_id, removed, size, compressed_size, crc FROM apk_entries WHERE apk_id = ?
+            ''', (apk_id,)))
+        return rows
+
+    # Contents of any stored build (see `metadata_state`), limited to `kinds`.
+    # The newest build of a package is read from apk_current; older ones replay
+    # their deltas on top of the last full copy before them.
+    def state(self, apk_id, kinds=tuple(KINDS.values())):
+        apk = self._apk(apk_id)
+        if apk is None:
+            return None
+        package_id, _, base_id, is_head, _ = apk
+        if is_head:
+            return self._current(package_id, kinds)
+        chain = [apk_id]
+        while base_id is not None:
+            chain.append(base_id)
+            base_id = self.conn.execute('SELECT base_id FROM apks WHERE id = ?', (base_id,)).fetchone()[0]
+        state = {}
+        for build_id in reversed(chain):
+            for kind, name_id, removed, *value in self._rows(build_id, kinds):
+                if removed:
+                    state.pop((kind, name_id), None)
+                else:
+                    state[(kind, name_id)] = tuple(value)
+        return state
+
+    def _write_rows(self, apk_id, rows):
+        self.conn.executemany(
+            'INSERT INTO apk_permissions (apk_id, permission_id, removed) VALUES (?, ?, ?)',
+            [(apk_id, name_id, removed) for kind, name_id, removed, *_ in rows if kind == PERMISSIONS],
+        )
+        self.conn.executemany(
+            'INSERT INTO apk_components (apk_id, kind, name_id, removed) VALUES (?, ?, ?, ?)',
+            [(apk_id, kind, name_id, removed) for kind, name_id, removed, *_ in rows
+             if kind in COMPONENT_KINDS.values()],
+        )
+        self.conn.executemany(
+            'INSERT INTO apk_entries (apk_id, name_id, removed, size, compressed_size, crc) VALUES (?, ?, ?, ?, ?, ?)',
+            [(apk_id,) + tuple(row[1:]) for row in rows if row[0] == FILES],
+        )
+
+    # Store one analysis inside the caller's transaction; returns the new apk id.
+    # `metadata["file_infos"]` ((name, size, compressed size, CRC) tuples) is used
+    # for the listing when present, else just the names in `metadata["files"]`.
+    def save(self, metadata, sha256=None, size=None, analyzed_at=None):
+        analyzed_at = analyzed_at or datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+        package_id, = self.intern([metadata["package_name"] or ""])
+        new = metadata_state(metadata, self.intern)
+
+        version_code = metadata.get("version_code")
+        head = self.conn.execute('''
+            SELECT a.id, a.depth, a.version_code FROM apk_heads h JOIN apks a ON a.id = h.apk_id
+            WHERE h.package_id = ?
+        ''', (package_id,)).fetchone()
+        if head is not None and version_code is not None and head[2] is not None and version_code < head[2]:
+            # An older build saved late: keep it as a full copy off the head's chain
+            apk_id = self.conn.execute(
+                'INSERT INTO apks (package_id, version, version_code, sha256, size, analyzed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (package_id, metadata["version"], version_code, sha256, size, analyzed_at),
+            ).lastrowid
+            self._write_rows(apk_id, state_delta({}, new))
+            return apk_id
+
+        old = self._current(package_id, tuple(KINDS.values())) if head else {}
+        delta = state_delta(old, new)
+        keyframe = head is None or head[1] + 1 >= self.keyframe_interval
+
+        apk_id = self.conn.execute('''
+            INSERT INTO apks (package_id, version, version_code, sha256, size, analyzed_at, base_id, depth)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (package_id, metadata["version"], version_code, sha256, size, analyzed_at,
+              None if keyframe else head[0], 0 if keyframe else head[1] + 1)).lastrowid
+        self._write_rows(apk_id, state_delta({}, new) if keyframe else delta)
+
+        # Bring the package's materialized view up to this build
+        self.conn.executemany(
+            'DELETE FROM apk_current WHERE package_id = ? AND kind = ? AND name_id = ?',
+            [(package_id, kind, name_id) for kind, name_id, removed, *_ in delta if removed],
+        )
+        self.conn.executemany('''
+            INSERT INTO apk_current (package_id, kind, name_id, size, compressed_size, crc) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(package_id, kind, name_id) DO UPDATE SET
+                size = excluded.size, compressed_size = excluded.compressed_size, crc = excluded.crc
+        ''', [(package_id, kind, name_id, *value) for kind, name_id, removed, *value in delta if not removed])
+        self.conn.execute('''
+            INSERT INTO apk_heads (package_id, apk_id) VALUES (?, ?)
+            ON CONFLICT(package_id) DO UPDATE SET apk_id = excluded.apk_id
+        ''', (package_id, apk_id))
+        return apk_id
+
+    # Store several (metadata, sha256, size) analyses in one transaction
+    def save_many(self, entries):
+        self.conn.execute('BEGIN')
+        try:
+            apk_ids = [self.save(metadata, sha256, size) for metadata, sha256, size in entries]
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self._ids.clear()
+            raise
+        return apk_ids
+
+    # Everything known about one build in the shape `APKAnalyzer.get_metadata`
+    # returns; the file listing is only loaded when `files` is true
+    def load(self, apk_id, files=True):
+        apk = self._apk(apk_id)
+        if apk is None:
+            return None
+        kinds = tuple(KINDS.values()) if files else tuple(kind for kind in KINDS.values() if kind != FILES)
+        state = self.state(apk_id, kinds)
+        names = self.values([name_id for _, name_id in state] + [apk[0]])
+        metadata = {"package_name": names[apk[0]], "version": apk[1], "version_code": apk[4]}
+        for field, kind in KINDS.items():
+            if kind != FILES:
+                metadata[field] = sorted(names[name_id] for k, name_id in state if k == kind)
+        if files:
+            metadata["file_infos"] = sorted(
+                (names[name_id],) + value for (kind, name_id), value in state.items() if kind == FILES
+            )
+            metadata["files"] = [info[0] for info in metadata["file_infos"]]
+        return metadata
+
+    # One page of the file listing: (name_id, name, size, compressed size, CRC),
+    # continuing after `after` (the last name_id of the previous page)
+    def files(self, apk_id, after=0, limit=500):
+        apk = self._apk(apk_id)
+        if apk is None:
+            return []
+        if apk[3]:
+            return self.conn.execute(APK_FILES_QUERY, (apk[0], after, limit)).fetchall()
+        entries = sorted((name_id, value) for (_, name_id), value in self.state(apk_id, (FILES,)).items()
+                         if name_id > after)[:limit]
+        names = self.values([name_id for name_id, _ in entries])
+        return [(name_id, names[name_id]) + value for name_id, value in entries]
+
+    def file_count(self, apk_id):
+        return len(self.state(apk_id, (FILES,)) or {})
+
+    # What changed from build `old_id` to build `new_id` (any two stored builds,
+    # usually of the same package): per field, the names added and removed, and
+    # for files the entries whose size or CRC changed
+    def diff(self, old_id, new_id):
+        old, new = self.state(old_id), self.state(new_id)
+        if old is None or new is None:
+            return None
+        changes = state_delta(old, new)
+        names = self.values([row[1] for row in changes])
+        result = {field: {"added": [], "removed": []} for field in KINDS}
+        result["files"]["changed"] = []
+        for kind, name_id, removed, *value in sorted(changes, key=lambda row: names[row[1]]):
+            entry = result[FIELDS[kind]]
+            name = names[name_id]
+            if removed:
+                entry["removed"].append(name)
+            elif (kind, name_id) in old:
+                before = old[(kind, name_id)]
+                entry["changed"].append({
+                    "name": name,
+                    "size": [before[0], value[0]],
+                    "compressed_size": [before[1], value[1]],
+                    "crc": [before[2], value[2]],
+                })
+            else:
+                entry["added"].append(name)
+        return result
+
+    # Stored builds of a package, oldest first: (apk id, version, analyzed_at, base_id)
+    def history(self, package_name):
+        return self.conn.execute(PACKAGE_HISTORY_QUERY, (package_name,)).fetchall()
+
+    # (apk id, package, version) of every stored build requesting `permission`,
+    # newest first, or with `heads_only` just the newest build of each package.
+    # A build without a row for the permission inherits it from its base, so
+    # builds are resolved along their delta chains in the order they were stored.
+    def with_permission(self, permission, heads_only=False):
+        if heads_only:
+            return self.conn.execute(APKS_WITH_PERMISSION_QUERY, (permission,)).fetchall()
+        rows = self.conn.execute(PERMISSION_ROWS_QUERY, (permission,)).fetchall()
+        if not rows:
+            return []
+        removed = {apk_id: flag for apk_id, _, flag in rows}
+        package_ids = list({package_id for _, package_id, _ in rows})
+        names = self.values(package_ids)
+        has = {}
+        for start in range(0, len(package_ids), _CHUNK):
+            chunk = package_ids[start:start + _CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            for apk_id, package_id, version, base_id in self.conn.execute(f'''
+                SELECT id, package_id, version, base_id FROM apks WHERE package_id IN ({placeholders}) ORDER BY id
+            ''', chunk):
+                if apk_id in removed:
+                    has[apk_id] = (package_id, version, not removed[apk_id])
+                else:
+                    has[apk_id] = (package_id, version, base_id is not None and has[base_id][2])
+        return [(apk_id, names[package_id], version)
+                for apk_id, (package_id, version, present) in sorted(has.items(), reverse=True) if present]
+
+
+# Keyset paging over the files of a package's newest build, in name_id order
+APK_FILES_QUERY = '''
+    SELECT c.name_id, s.value, c.size, c.compressed_size, c.crc
+    FROM apk_current c JOIN strings s ON s.id = c.name_id
+    WHERE c.package_id = ? AND c.kind = 5 AND c.name_id > ?
+    ORDER BY c.name_id
+    LIMIT ?
+'''
+
+# Every link row for a permission, added or removed, from idx_apk_permissions_permission
+PERMISSION_ROWS_QUERY = '''
+    SELECT p.apk_id, a.package_id, p.removed
+    FROM strings perm
+    JOIN apk_permissions p ON p.permission_id = perm.id
+    JOIN apks a ON a.id = p.apk_id
+    WHERE perm.value = ?
+'''
+
+# Newest builds only, served from idx_apk_current_name: one string lookup, then an index range
+APKS_WITH_PERMISSION_QUERY = '''
+    SELECT h.apk_id, pkg.value, a.version
+    FROM strings perm
+    JOIN apk_current c ON c.kind = 4 AND c.name_id = perm.id
+    JOIN apk_heads h ON h.package_id = c.package_id
+    JOIN apks a ON a.id = h.apk_id
+    JOIN strings pkg ON pkg.id = c.package_id
+    WHERE perm.value = ?
+    ORDER BY h.apk_id DESC
+'''
+
+PACKAGE_HISTORY_QUERY = '''
+    SELECT a.id, a.version, a.analyzed_at, a.base_id
+    FROM strings pkg JOIN apks a ON a.package_id = pkg.id
+    WHERE pkg.value = ?
+    ORDER BY a.id
+'''
+
+# The newest analysis with its permissions and components joined for display and
+# only a count of its files
+LATEST_APK_QUERY = '''
+    SELECT a.id, pkg.value, a.version, a.analyzed_at,
+        (SELECT GROUP_CONCAT(s.value, ', ') FROM apk_current c JOIN strings s ON s.id = c.name_id
+         WHERE c.package_id = a.package_id AND c.kind = 4),
+        (SELECT GROUP_CONCAT(s.value, ', ') FROM apk_current c JOIN strings s ON s.id = c.name_id
+         WHERE c.package_id = a.package_id AND c.kind = 0),
+        (SELECT GROUP_CONCAT(s.value, ', ') FROM apk_current c JOIN strings s ON s.id = c.name_id
+         WHERE c.package_id = a.package_id AND c.kind = 1),
+        (SELECT GROUP_CONCAT(s.value, ', ') FROM apk_current c JOIN strings s ON s.id = c.name_id
+         WHERE c.package_id = a.package_id AND c.kind = 2),
+        (SELECT GROUP_CONCAT(s.value, ', ') FROM apk_current c JOIN strings s ON s.id = c.name_id
+         WHERE c.package_id = a.package_id AND c.kind = 3),
+        (SELECT COUNT(*) FROM apk_current c WHERE c.package_id = a.package_id AND c.kind = 5)
+    FROM apk_heads h JOIN apks a ON a.id = h.apk_id JOIN strings pkg ON pkg.id = a.package_id
+    ORDER BY a.id DESC
+    LIMIT 1
+'''
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import time
+from bisect import bisect_right
+from collections import deque
+
+from downsample import lttb_indices
+
+# Bump whenever the shape of the messages below changes
+PROTOCOL_VERSION = 2
+
+
+class Subscriber:
+    """A single /ws client's outbound queue."""
+
+    def __init__(self, queue_size):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def close(self):
+        # Throw away anything still pending and wake the sender with a sentinel
+        self.closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class BatteryHub:
+    """Tracks the battery window once per tick and fans updates out to every subscriber.
+
+    `producer` is a blocking callable returning the current window as a time-ordered
+    list of (timestamp, level, epoch) tuples; it runs in a worker thread so the
+    event loop stays free. Every point gets a sequence number, so clients receive
+    one snapshot and then only the points appended after their cursor:
+
+        {"v": 2, "type": "snapshot", "epoch": ..., "seq": n, "x": [...], "y": [...]}
+        {"v": 2, "type": "delta", "epoch": ..., "from": m, "seq": n, "x": [...], "y": [...], "cutoff": t}
+
+    `cutoff` is the timestamp of the oldest point still in the window; the browser
+    drops plotted points before it. Snapshots are reduced to `max_points` with
+    LTTB, so no message grows with the length of the window, and once `max_points`
+    raw points have been appended since the last one a fresh snapshot is broadcast,
+    so a chart never holds more than about twice `max_points` points.
+    """
+
+    def __init__(self, producer, interval=5, queue_size=4, send_timeout=10, max_points=1000):
+        self.producer = producer
+        self.max_points = max_points
+        self.interval = interval
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.subscribers = set()
+        self.points = deque()  # (seq, timestamp, level, epoch)
+        self.seq = 0
+        # Sequence numbers restart with the process; the epoch tells clients when to resync
+        self.epoch = str(time.time_ns())
+        self.ticks = 0
+        self.dropped = 0
+        self.last_build_ms = 0.0
+        self._snapshot = None
+        self._rebased_at = 0  # seq of the last broadcast snapshot
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber)
+
+    def _message(self, kind, points, **extra):
+        message = {"v": PROTOCOL_VERSION, "type": kind, "epoch": self.epoch, "seq": self.seq}
+        message.update(extra)
+        message["x"] = [point[1] for point in points]
+        message["y"] = [point[2] for point in points]
+        return json.dumps(message)
+
+    def _cutoff(self):
+        return self.points[0][1] if self.points else None
+
+    def snapshot(self):
+        # Serialized at most once per sequence number, however many clients join
+        if self._snapshot is None or self._snapshot[0] != self.seq:
+            points = list(self.points)
+            if len(points) > self.max_points:
+                selected = lttb_indices(
+                    [point[3] for point in points], [point[2] for point in points], self.max_points
+                )
+                points = [points[i] for i in selected]
+            self._snapshot = (self.seq, self._message("snapshot", points))
+        return self._snapshot[1]
+
+    # First message for a client resuming from `cursor` (None when it has nothing yet)
+    def catch_up(self, epoch=None, cursor=None):
+        if cursor is not None and epoch == self.epoch:
+            oldest = self.points[0][0] if self.points else self.seq + 1
+            if cursor == self.seq:
+                return None
+            if oldest - 1 <= cursor < self.seq and self.seq - cursor <= self.max_points:
+                missed = [point for point in self.points if point[0] > cursor]
+                return self._message("delta", missed, cutoff=self._cutoff(), **{"from": cursor})
+        if self.seq == 0:
+            return None
+        return self.snapshot()
+
+    def subscribe(self, epoch=None, cursor=None):
+        subscriber = Subscriber(self.queue_size)
+        first = self.catch_up(epoch, cursor)
+        if first is not None:
+            subscriber.queue.put_nowait(first)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.discard(subscriber)
+            subscriber.close()
+
+    # Fold the producer's window into the sequenced point log, returning the new points
+    def ingest(self, window):
+        last_timestamp = self.points[-1][1] if self.points else None
+        if window:
+            while self.points and self.points[0][1] < window[0][0]:
+                self.points.popleft()
+        else:
+            self.points.clear()
+
+        # The window is time-ordered, so only its tail past the last point is new
+        start = 0 if last_timestamp is None else bisect_right(window, last_timestamp, key=lambda point: point[0])
+        fresh = []
+        for timestamp, level, epoch in window[start:]:
+            self.seq += 1
+            point = (self.seq, timestamp, level, epoch)
+            self.points.append(point)
+            fresh.append(point)
+        return fresh
+
+    def publish(self, payload):
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                # The client has fallen `queue_size` ticks behind, cut it loose;
+                # it can reconnect with its cursor and catch up
+                self.dropped += 1
+                self.unsubscribe(subscriber)
+
+    async def _run(self):
+        while True:
+            try:
+                started = time.perf_counter()
+                window = await asyncio.to_thread(self.producer)
+                previous = self.seq
+                fresh = self.ingest(window or [])
+                if fresh and len(self.points) > self.max_points and self.seq - self._rebased_at >= self.max_points:
+                    # Clients have appended a window's worth of raw points to their
+                    # downsampled chart; replace it with a fresh downsampled one
+                    self._rebased_at = self.seq
+                    self.publish(self.snapshot())
+                elif fresh:
+                    self.publish(self._message("delta", fresh, cutoff=self._cutoff(), **{"from": previous}))
+                self.last_build_ms = (time.perf_counter() - started) * 1000
+                self.ticks += 1
+            except Exception as e:
+                print(f"Battery hub error: {e}")
+            await asyncio.sleep(self.interval)
+
+    # Pump queued payloads into one websocket until it disconnects or is dropped
+    async def serve(self, websocket, epoch=None, cursor=None):
+        subscriber = self.subscribe(epoch, cursor)
+        try:
+            while True:
+                payload = await subscriber.queue.get()
+                if payload is None:
+                    break
+                await asyncio.wait_for(websocket.send_text(payload), self.send_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "dropped": self.dropped,
+            "ticks": self.ticks,
+            "seq": self.seq,
+            "window_points": len(self.points),
+            "last_build_ms": round(self.last_build_ms, 2),
+            "interval": self.interval,
+        }
@@ -0,0 +1,172 @@
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+# BatteryManager constants as printed by `dumpsys battery`
+BATTERY_STATUS = {1: "unknown", 2: "charging", 3: "discharging", 4: "not charging", 5: "full"}
+BATTERY_HEALTH = {
+    1: "unknown",
+    2: "good",
+    3: "overheat",
+    4: "dead",
+    5: "over voltage",
+    6: "unspecified failure",
+    7: "cold",
+}
+POWER_SOURCES = (("AC powered", "ac"), ("USB powered", "usb"), ("Wireless powered", "wireless"),
+                 ("Dock powered", "dock"))
+
+# One round trip per sample: the battery service dump plus the fuel gauge's
+# instantaneous current, which `dumpsys battery` doesn't always include
+BATTERY_COMMAND = (
+    "dumpsys battery; "
+    "echo current_now: $(cat /sys/class/power_supply/battery/current_now 2>/dev/null)"
+)
+
+# Build fingerprint, which changes whenever the system image does (OTA, flash)
+FINGERPRINT_COMMAND = "getprop ro.build.fingerprint"
+
+
+class ShellError(RuntimeError):
+    pass
+
+
+class ShellSession:
+    """One long-lived `adb shell` per device, reused for every command.
+
+    Starting `adb shell` costs a process spawn plus a transport handshake, so
+    the session is kept open and each command is written to its stdin followed
+    by an echo of a random sentinel; output is read up to that sentinel. A
+    reader thread feeds stdout lines into a queue so reads can time out. If the
+    shell dies or a command times out the session is restarted on the next call.
+    """
+
+    def __init__(self, serial=None, adb="adb", timeout=10.0):
+        self.serial = serial
+        self.adb = adb
+        self.timeout = timeout
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.restarts = 0
+
+    def _start(self):
+        if self._lines is not None:
+            self.restarts += 1
+        command = [self.adb] + (["-s", self.serial] if self.serial else []) + ["shell"]
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
+        )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self._process, self._lines), daemon=True).start()
+
+    @staticmethod
+    def _pump(process, lines):
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)  # EOF
+
+    def _stop(self):
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            self._process = None
+
+    # Output of `command` (stdout and stderr) run in the persistent shell
+    def run(self, command, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self._process is None or self._process.poll() is not None:
+                self._start()
+            sentinel = f"__done_{uuid.uuid4().hex}__"
+            try:
+                self._process.stdin.write(f"{command}\necho {sentinel}\n")
+                self._process.stdin.flush()
+            except OSError as e:
+                self._stop()
+                raise ShellError(f"adb shell is gone: {e}")
+
+            output = []
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    line = self._lines.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self._stop()
+                    raise TimeoutError(f"{command!r} took over {timeout}s")
+                if line is None:
+                    self._stop()
+                    raise ShellError("adb shell exited: " + "".join(output).strip())
+                if line.rstrip("\r\n") == sentinel:
+                    break
+                output.append(line)
+            self.commands += 1
+            return "".join(output)
+
+    def close(self):
+        with self._lock:
+            if self._process is not None and self._process.poll() is None:
+                try:
+                    self._process.stdin.write("exit\n")
+                    self._process.stdin.flush()
+                    self._process.wait(timeout=2)
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+            self._stop()
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Typed battery state from `dumpsys battery` output: level (percent), temperature
+# (deg C), voltage (mV), current (uA, from current_now when present), status,
+# health and the power source it is plugged into
+def parse_dumpsys_battery(text):
+    fields = {}
+    for line in text.splitlines():
+        key, separator, value = line.strip().partition(":")
+        if separator:
+            fields[key.strip()] = value.strip()
+
+    level = _int(fields.get("level"))
+    scale = _int(fields.get("scale"))
+    if level is not None and scale and scale != 100:
+        level = round(level * 100 / scale)
+    temperature = _int(fields.get("temperature"))  # tenths of a degree
+    status = _int(fields.get("status"))
+    health = _int(fields.get("health"))
+    plugged = [name for label, name in POWER_SOURCES if fields.get(label) == "true"]
+    return {
+        "level": level,
+        "temperature": temperature / 10 if temperature is not None else None,
+        "voltage": _int(fields.get("voltage")),
+        "current": _int(fields.get("current now", fields.get("current_now"))),
+        "status": BATTERY_STATUS.get(status, fields.get("status")),
+        "health": BATTERY_HEALTH.get(health, fields.get("health")),
+        "plugged": ",".join(plugged) or None,
+    }
+
+
+def read_battery(shell):
+    return parse_dumpsys_battery(shell.run(BATTERY_COMMAND))
+
+
+def read_fingerprint(shell):
+    return shell.run(FINGERPRINT_COMMAND).strip()
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import zebpay_store
+from proxy_pool import ProxyPool
+from replay_server import REPLAY_URL, ProxyProfile, ReplayFarm, load_payloads
+from scheduler import RateLimiter
+from zeb_scraper import AsyncScraper
+
+
+# Offline benchmark of the zeb.py pipeline: hedged polling through emulated
+# proxies replaying recorded replies, ingested into a throwaway zebpay_data.db
+def run_benchmark(source, polls=200, proxies=8, dead=2, latency=0.05, jitter=0.1, error_rate=0.05,
+                  timeout_rate=0.02, html_rate=0.03, parallel=4, hedge=2, concurrency=16, attempts=3,
+                  timeout=(1, 2), delta=False, polls_per_commit=1, rate=None, seed=0):
+    random.seed(seed)
+    payloads = load_payloads(source)
+    profiles = [
+        # Spread the base latency so the pool has fast and slow proxies to rank
+        ProxyProfile(latency * (1 + i), jitter, error_rate, timeout_rate, html_rate, hang=timeout[1] * 2)
+        for i in range(proxies)
+    ]
+    farm = ReplayFarm(payloads, profiles, dead=dead).start()
+    pool = ProxyPool(farm.proxies())
+
+    with tempfile.TemporaryDirectory() as directory:
+        conn = zebpay_store.connect(os.path.join(directory, "bench.db"))
+        if delta:
+            writer = zebpay_store.DeltaWriter(conn, polls_per_commit=polls_per_commit)
+        else:
+            writer = zebpay_store.SnapshotWriter(conn, polls_per_commit=polls_per_commit)
+        fetched_at = [int(time.time())]
+
+        def handle_response(proxy, payload, latency):
+            # Recordings repeat, so advance the clock per poll to keep the data distinct
+            fetched_at[0] += 1
+            writer.add(payload, fetched_at=fetched_at[0])
+
+        scraper = AsyncScraper(
+            pool,
+            REPLAY_URL,
+            on_response=handle_response,
+            concurrency=concurrency,
+            hedge=hedge,
+            attempts=attempts,
+            timeout=timeout,
+            limiter=RateLimiter(rate, max(1, parallel)) if rate else None,
+        )
+        started = time.perf_counter()
+        try:
+            asyncio.run(scraper.scrape(polls, parallel=parallel))
+            writer.flush()
+        finally:
+            elapsed = time.perf_counter() - started
+            scraper.close()
+            farm.stop()
+            conn.close()
+
+    scraper_stats = scraper.stats()
+    writer_stats = writer.stats()
+    return {
+        "polls": polls,
+        "seconds": round(elapsed, 2),
+        "polls_per_sec": round(scraper_stats["successes"] / elapsed, 1),
+        "successes": scraper_stats["successes"],
+        "failed_attempts": scraper_stats["failures"],
+        "p50_ms": scraper_stats["p50_ms"],
+        "p99_ms": scraper_stats["p99_ms"],
+        "rows": writer_stats["rows"],
+        "insert_rows_per_sec": writer_stats["rows_per_sec"],
+        "ingested_rows_per_sec": round(writer_stats["rows"] / elapsed, 1),
+        "proxy_outcomes": farm.counts(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ZebPay scraper against replayed responses")
+    parser.add_argument("source", nargs="?", default="zebpay_data.json",
+                        help="zebpay_data.json dump or segment log directory")
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--proxies", type=int, default=8)
+    parser.add_argument("--dead", type=int, default=2, help="proxies that refuse connections")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--timeout-rate", type=float, default=0.02)
+    parser.add_argument("--html-rate", type=float, default=0.03)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--hedge", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--read-timeout", type=float, default=2)
+    parser.add_argument("--delta", action="store_true", help="store changes only (DeltaWriter)")
+    parser.add_argument("--polls-per-commit", type=int, default=1)
+    parser.add_argument("--rate", type=float, help="host requests/sec limit")
+    args = parser.parse_args()
+
+    results = run_benchmark(
+        args.source,
+        polls=args.polls,
+        proxies=args.proxies,
+        dead=args.dead,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        html_rate=args.html_rate,
+        parallel=args.parallel,
+        hedge=args.hedge,
+        concurrency=args.concurrency,
+        timeout=(1, args.read_timeout),
+        delta=args.delta,
+        polls_per_commit=args.polls_per_commit,
+        rate=args.rate,
+    )
+    outcomes = results.pop("proxy_outcomes")
+    print()
+    for proxy, counts in outcomes.items():
+        print(f"{proxy}: {counts}")
+    for key, value in results.items():
+        print(f"{key:>24}: {value}")
@@ -1,51 +1,38 @@
-import sqlite3
-from androguard.core.bytecodes.apk import APK
-import datetime
+import argparse
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import apk_store
+from apk_cache import AnalysisCache, file_sha256
+from apk_manifest import ManifestAnalyzer
+from apk_store import ApkStore
+
+# androguard is only needed for full analysis (--full); the default manifest-only
+# path reads the APK with zipfile and apk_manifest.parse_axml
+try:
+    from androguard.core.bytecodes.apk import APK
+except ImportError:
+    APK = None
 
 # SQLite Database Setup
-DB_NAME = "apk_metadata.db"
+DB_NAME = apk_store.DB_NAME
 
 def create_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-
-    # Create a table if it doesn't exist
-    c.execute('''CREATE TABLE IF NOT EXISTS apk_metadata (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    package_name TEXT,
-                    version TEXT,
-                    permissions TEXT,
-                    activities TEXT,
-                    services TEXT,
-                    receivers TEXT,
-                    providers TEXT,
-                    files TEXT,
-                    timestamp TEXT
-                )''')
-    conn.commit()
-    conn.close()
+    connect_db().close()
+
+def connect_db():
+    return apk_store.connect(DB_NAME)
+
+# Store several analyses in one transaction; each entry is a metadata dict or a
+# (metadata, sha256, size) tuple
+def save_many(conn, metadatas):
+    entries = [entry if isinstance(entry, tuple) else (entry, None, None) for entry in metadatas]
+    return ApkStore(conn).save_many(entries)
 
 def save_to_db(metadata):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-
-    # Insert metadata into the table
-    c.execute('''INSERT INTO apk_metadata (
-                    package_name, version, permissions, activities, services,
-                    receivers, providers, files, timestamp
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', (
-                    metadata['package_name'],
-                    metadata['version'],
-                    ', '.join(metadata['permissions']),
-                    ', '.join(metadata['activities']),
-                    ', '.join(metadata['services']),
-                    ', '.join(metadata['receivers']),
-                    ', '.join(metadata['providers']),
-                    ', '.join(metadata['files']),
-                    datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                ))
-
-    conn.commit()
+    conn = connect_db()
+    save_many(conn, [metadata])
     conn.close()
     print(f"Metadata for {metadata['package_name']} saved to the database.")
 
@@ -53,6 +40,8 @@ def save_to_db(metadata):
 class APKAnalyzer:
     def __init__(self, apk_path):
         self.apk_path = apk_path
+        if APK is None:
+            raise RuntimeError("Full analysis needs androguard (pip install androguard)")
         self.apk = APK(self.apk_path)
 
     def get_package_name(self):
@@ -61,6 +50,12 @@ class APKAnalyzer:
     def get_version(self):
         return self.apk.get_androidversion_name()
 
+    def get_version_code(self):
+        try:
+            return int(self.apk.get_androidversion_code())
+        except (TypeError, ValueError):
+            return None
+
     def get_permissions(self):
         return self.apk.get_permissions()
 
@@ -79,39 +74,248 @@ class APKAnalyzer:
     def get_files(self):
         return self.apk.get_files()
 
+    # (name, uncompressed size, compressed size, CRC-32) per archive entry
+    def get_file_infos(self):
+        with zipfile.ZipFile(self.apk_path) as archive:
+            return [(entry.filename, entry.file_size, entry.compress_size, entry.CRC) for entry in archive.infolist()]
+
     def get_metadata(self):
         return {
             "package_name": self.get_package_name(),
             "version": self.get_version(),
+            "version_code": self.get_version_code(),
             "permissions": self.get_permissions(),
             "activities": self.get_activities(),
             "services": self.get_services(),
             "receivers": self.get_receivers(),
             "providers": self.get_providers(),
             "files": self.get_files(),
+            "file_infos": self.get_file_infos(),
         }
 
+# Worker for the process pool: analyze one APK and time it. Errors are returned
+# rather than raised so one bad APK doesn't take down the batch. `full` parses
+# the whole APK with androguard instead of just the manifest and file listing.
+def analyze_apk(apk_path, full=False):
+    started = time.perf_counter()
+    try:
+        analyzer = APKAnalyzer(apk_path) if full else ManifestAnalyzer(apk_path)
+        metadata = analyzer.get_metadata()
+        error = None
+    except Exception as e:
+        metadata = None
+        error = f"{type(e).__name__}: {e}"
+    return {"path": apk_path, "metadata": metadata, "seconds": time.perf_counter() - started, "error": error}
+
+# APK paths from directories (searched recursively), manifest files (one path
+# per line) and plain .apk paths
+def find_apks(targets):
+    paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            for root, _, names in os.walk(target):
+                paths.extend(os.path.join(root, name) for name in sorted(names) if name.lower().endswith('.apk'))
+        elif target.lower().endswith('.apk'):
+            paths.append(target)
+        else:
+            with open(target, 'r') as manifest:
+                paths.extend(line.strip() for line in manifest if line.strip() and not line.startswith('#'))
+    return paths
+
+# Hash every APK (reusing stored hashes for unchanged files); hashing runs on
+# threads since hashlib releases the GIL. Returns {path: (sha256, size)} and failures.
+def hash_apks(cache, apk_paths, workers):
+    hashes = {}
+    failures = []
+    to_hash = []
+    for path in apk_paths:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            failures.append({"path": path, "metadata": None, "seconds": 0.0, "error": f"{type(e).__name__}: {e}"})
+            continue
+        sha256 = cache.known_sha256(path, stat)
+        if sha256:
+            hashes[path] = (sha256, stat.st_size)
+        else:
+            to_hash.append((path, stat))
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(file_sha256, path): (path, stat) for path, stat in to_hash}
+            cache.conn.execute('BEGIN')
+            for future in as_completed(futures):
+                path, stat = futures[future]
+                try:
+                    sha256 = future.result()
+                except OSError as e:
+                    failures.append({"path": path, "metadata": None, "seconds": 0.0, "error": f"{type(e).__name__}: {e}"})
+                    continue
+                cache.remember(path, sha256, stat)
+                hashes[path] = (sha256, stat.st_size)
+            cache.conn.commit()
+    return hashes, failures
+
+# Analyze many APKs across a process pool, writing results to apk_metadata.db in
+# transactions of `batch_size` as workers finish. Each transaction saves its
+# builds ordered by (package, version code); a build that finishes after a newer
+# one of its package is kept by ApkStore.save as a full copy. APKs whose content
+# hash was analyzed before are served from the cache instead of being parsed
+# again, and byte-identical copies within the batch are parsed once.
+def analyze_batch(apk_paths, workers=None, batch_size=20, cache_size=256, full=False):
+    workers = workers or os.cpu_count() or 1
+    conn = connect_db()
+    cache = AnalysisCache(conn, capacity=cache_size)
+    pending = []
+    analyzed = []
+    started = time.perf_counter()
+
+    def flush():
+        if pending:
+            pending.sort(key=lambda entry: (entry[0]["package_name"] or "", entry[0].get("version_code") or 0))
+            save_many(conn, pending)
+            pending.clear()
+
+    try:
+        hashes, failures = hash_apks(cache, apk_paths, workers)
+        hashed_at = time.perf_counter()
+
+        work = {}
+        for path, (sha256, size) in hashes.items():
+            metadata = cache.get(sha256)
+            if metadata is None:
+                work.setdefault(sha256, []).append(path)
+                continue
+            analyzed.append({"path": path, "sha256": sha256, "metadata": metadata, "seconds": 0.0, "error": None,
+                             "cached": True})
+            print(f"{path}: {metadata['package_name']} {metadata['version']} (cached)")
+
+        if work:
+            with ProcessPoolExecutor(max_workers=min(workers, len(work))) as executor:
+                futures = {executor.submit(analyze_apk, paths[0], full): sha256 for sha256, paths in work.items()}
+                for future in as_completed(futures):
+                    sha256 = futures[future]
+                    result = future.result()
+                    if result["error"]:
+                        failures.append(result)
+                        print(f"FAILED {result['path']} after {result['seconds']:.2f}s: {result['error']}")
+                        continue
+                    metadata = result["metadata"]
+                    cache.put(sha256, metadata)
+                    pending.append((metadata, sha256, hashes[result["path"]][1]))
+                    for path in work[sha256]:
+                        analyzed.append(dict(result, path=path, sha256=sha256, cached=path != result["path"]))
+                    print(f"{result['path']}: {metadata['package_name']} "
+                          f"{metadata['version']} in {result['seconds']:.2f}s")
+                    if len(pending) >= batch_size:
+                        flush()
+            flush()
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    parsed = [result for result in analyzed if not result["cached"]]
+    cpu_seconds = sum(result["seconds"] for result in parsed + failures)
+    print(f"Analyzed {len(analyzed)} APKs ({len(parsed)} parsed, {len(analyzed) - len(parsed)} cached, "
+          f"{len(failures)} failed) in {elapsed:.2f}s with {workers} workers "
+          f"(hashing {hashed_at - started:.2f}s, {cpu_seconds:.2f}s of parsing)")
+    print(f"Cache stats: {cache.stats()}")
+    return analyzed, failures
+
+# Time the manifest-only path against full androguard parsing on one APK and
+# report any field where their results differ
+def benchmark(apk_path, repeat=3):
+    modes = [("manifest", ManifestAnalyzer)]
+    if APK is not None:
+        modes.append(("androguard", APKAnalyzer))
+    else:
+        print("androguard is not installed; timing the manifest-only path alone")
+
+    results = {}
+    for name, analyzer_class in modes:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            metadata = analyzer_class(apk_path).get_metadata()
+            timings.append(time.perf_counter() - started)
+        results[name] = (min(timings), metadata)
+        print(f"{name:>10}: best of {repeat} {min(timings) * 1000:.1f} ms, mean {sum(timings) / repeat * 1000:.1f} ms")
+
+    if len(results) == 2:
+        fast, fast_metadata = results["manifest"]
+        full, full_metadata = results["androguard"]
+        print(f"Manifest-only path is {full / fast:.1f}x faster")
+        for key in fast_metadata:
+            ours, theirs = fast_metadata[key], full_metadata[key]
+            if isinstance(ours, list):
+                if set(ours) != set(theirs):
+                    print(f"  {key} differs: only manifest {sorted(set(ours) - set(theirs))[:5]}, "
+                          f"only androguard {sorted(set(theirs) - set(ours))[:5]}")
+            elif ours != theirs:
+                print(f"  {key} differs: manifest {ours!r}, androguard {theirs!r}")
+    return results
+
 # Example usage:
 if __name__ == "__main__":
-    apk_path = r'C:\Appy\scripts\Chrome.apk'  
-    analyzer = APKAnalyzer(apk_path)
-
-    # Create the database and table if it doesn't exist
-    create_db()
-
-    # Extract metadata
-    metadata = analyzer.get_metadata()
-
-    # Save metadata to the database
-    save_to_db(metadata)
-
-    # Print the collected metadata
-    print("APK Metadata:")
-    print(f"Package Name: {metadata['package_name']}")
-    print(f"Version: {metadata['version']}")
-    print(f"Permissions: {', '.join(metadata['permissions'])}")
-    print(f"Activities: {', '.join(metadata['activities'])}")
-    print(f"Services: {', '.join(metadata['services'])}")
-    print(f"Receivers: {', '.join(metadata['receivers'])}")
-    print(f"Providers: {', '.join(metadata['providers'])}")
-    print(f"Files: {', '.join(metadata['files'])}")
+    parser = argparse.ArgumentParser(description="Extract APK metadata into apk_metadata.db")
+    parser.add_argument("targets", nargs="*", help="APK files, directories of APKs, or manifest files listing APK paths")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="analysis processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=20, help="APKs saved per database transaction")
+    parser.add_argument("--full", action="store_true", help="parse the whole APK with androguard")
+    parser.add_argument("--benchmark", metavar="APK", help="compare manifest-only and androguard parsing of one APK")
+    parser.add_argument("--history", metavar="PACKAGE", help="list the stored builds of a package")
+    parser.add_argument("--diff", nargs=2, type=int, metavar=("OLD_ID", "NEW_ID"),
+                        help="show what changed between two stored builds")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    elif args.history:
+        conn = connect_db()
+        for apk_id, version, analyzed_at, base_id in ApkStore(conn).history(args.history):
+            print(f"{apk_id:>6}  {version}  {analyzed_at}  {'delta' if base_id else 'full'}")
+        conn.close()
+    elif args.diff:
+        conn = connect_db()
+        changes = ApkStore(conn).diff(*args.diff)
+        conn.close()
+        if changes is None:
+            raise SystemExit("unknown apk id")
+        for field, change in changes.items():
+            for name in change["added"]:
+                print(f"+ {field}: {name}")
+            for name in change["removed"]:
+                print(f"- {field}: {name}")
+            for entry in change.get("changed", []):
+                print(f"~ {field}: {entry['name']} size {entry['size'][0]} -> {entry['size'][1]}, "
+                      f"crc {entry['crc'][0]} -> {entry['crc'][1]}")
+    elif args.targets:
+        analyze_batch(find_apks(args.targets), workers=args.workers, batch_size=args.batch_size, full=args.full)
+    else:
+        apk_path = r'C:\Appy\scripts\Chrome.apk'  
+
+        # Extract metadata (or reuse it if this exact APK was analyzed before) and
+        # save it to the database
+        analyzed, failures = analyze_batch([apk_path], workers=1, full=args.full)
+        if failures:
+            raise SystemExit(failures[0]["error"])
+        metadata = analyzed[0]["metadata"]
+
+        # Print the collected metadata
+        print("APK Metadata:")
+        print(f"Package Name: {metadata['package_name']}")
+        print(f"Version: {metadata['version']}")
+        print(f"Permissions: {', '.join(metadata['permissions'])}")
+        print(f"Activities: {', '.join(metadata['activities'])}")
+        print(f"Services: {', '.join(metadata['services'])}")
+        print(f"Receivers: {', '.join(metadata['receivers'])}")
+        print(f"Providers: {', '.join(metadata['providers'])}")
+        if 'files' in metadata:
+            file_count = len(metadata['files'])
+        else:
+            # Cached analyses leave the file listing in apk_entries until asked for
+            conn = connect_db()
+            store = ApkStore(conn)
+            file_count = store.file_count(store.find(analyzed[0]['sha256']))
+            conn.close()
+        print(f"Files: {file_count} entries")
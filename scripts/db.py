@@ -0,0 +1,202 @@
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class Database:
+    """Bounded pool of SQLite connections with async helpers for the FastAPI app.
+
+    Connections are opened lazily (at most `pool_size`), switched to WAL so readers
+    don't block the writer, and handed back to the pool after each query. Since the
+    connections are long-lived, sqlite3's per-connection statement cache keeps the
+    compiled statements around, so repeated queries skip the prepare step. The
+    `a*` methods run the same queries on a dedicated thread pool, so a slow query
+    never blocks the event loop.
+    """
+
+    def __init__(self, path, pool_size=4, timeout=10.0, cached_statements=128):
+        self.path = path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sqlite")
+        self._timings = {}
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=%d' % int(self.timeout * 1000))
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._opened < self.pool_size
+            if create:
+                self._opened += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+        try:
+            return self._pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"connection pool for {self.path} exhausted")
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.put(conn)
+
+    def _record(self, sql, started):
+        elapsed = (time.perf_counter() - started) * 1000
+        key = ' '.join(sql.split())
+        with self._lock:
+            timing = self._timings.setdefault(key, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    def fetch_all(self, sql, params=()):
+        started = time.perf_counter()
+        with self.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        self._record(sql, started)
+        return rows
+
+    def fetch_one(self, sql, params=()):
+        started = time.perf_counter()
+        with self.connection() as conn:
+            row = conn.execute(sql, params).fetchone()
+        self._record(sql, started)
+        return row
+
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        with self.connection() as conn:
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            rowcount = cursor.rowcount
+        self._record(sql, started)
+        return rowcount
+
+    def execute_many(self, sql, rows):
+        started = time.perf_counter()
+        with self.connection() as conn:
+            cursor = conn.executemany(sql, rows)
+            conn.commit()
+            rowcount = cursor.rowcount
+        self._record(sql, started)
+        return rowcount
+
+    def execute_script(self, script):
+        with self.connection() as conn:
+            conn.executescript(script)
+            conn.commit()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def afetch_all(self, sql, params=()):
+        return await self._run(self.fetch_all, sql, params)
+
+    async def afetch_one(self, sql, params=()):
+        return await self._run(self.fetch_one, sql, params)
+
+    async def aexecute(self, sql, params=()):
+        return await self._run(self.execute, sql, params)
+
+    async def aexecute_many(self, sql, rows):
+        return await self._run(self.execute_many, sql, rows)
+
+    # Per-statement call count, total and worst time in milliseconds
+    def stats(self):
+        with self._lock:
+            return {
+                sql: {
+                    "calls": count,
+                    "total_ms": round(total, 3),
+                    "avg_ms": round(total / count, 3),
+                    "max_ms": round(worst, 3),
+                }
+                for sql, (count, total, worst) in self._timings.items()
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._opened = 0
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+# One shared pool per database file
+def get_database(path, **options):
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = Database(path, **options)
+        return _databases[path]
+
+
+def close_all():
+    with _databases_lock:
+        for database in _databases.values():
+            database.close()
+        _databases.clear()
+
+
+# Bring a database up to date with an ordered list of schema steps. Each step is a
+# SQL script or a callable taking the connection; PRAGMA user_version records how
+# many have been applied, so every step runs exactly once per database file.
+def apply_migrations(conn, migrations):
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    for version, step in enumerate(migrations[current:], start=current + 1):
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('BEGIN')
+        try:
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return max(len(migrations) - current, 0)
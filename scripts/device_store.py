@@ -0,0 +1,243 @@
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+from db import apply_migrations
+
+DB_NAME = "device_data.db"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Keys the collector re-reads every sample; everything else is a static device fact
+DYNAMIC_KEYS = ("Battery level", "Timestamp")
+
+MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS devices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_key TEXT NOT NULL UNIQUE,
+        about_device TEXT,
+        device_name TEXT,
+        model TEXT,
+        processor TEXT,
+        ram TEXT,
+        battery_capacity TEXT,
+        facts TEXT NOT NULL,
+        updated_at INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS battery_readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_id INTEGER NOT NULL REFERENCES devices(id),
+        ts INTEGER NOT NULL,
+        level INTEGER
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_battery_readings_device_ts
+        ON battery_readings (device_id, ts)
+    ''',
+    # Full `dumpsys battery` telemetry per reading, and the adb serial a device's
+    # cached facts belong to
+    '''
+    ALTER TABLE battery_readings ADD COLUMN temperature REAL;
+    ALTER TABLE battery_readings ADD COLUMN voltage INTEGER;
+    ALTER TABLE battery_readings ADD COLUMN current INTEGER;
+    ALTER TABLE battery_readings ADD COLUMN status TEXT;
+    ALTER TABLE battery_readings ADD COLUMN health TEXT;
+    ALTER TABLE battery_readings ADD COLUMN plugged TEXT;
+    ALTER TABLE devices ADD COLUMN serial TEXT;
+    CREATE INDEX IF NOT EXISTS idx_devices_serial ON devices (serial)
+    ''',
+    # Devices are keyed by adb serial once it is known, and the fleet collector
+    # keeps each device's sampling health next to it
+    '''
+    UPDATE devices SET device_key = serial
+        WHERE serial IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM devices other WHERE other.device_key = devices.serial);
+    CREATE TABLE IF NOT EXISTS device_metrics (
+        device_id INTEGER PRIMARY KEY REFERENCES devices(id),
+        samples INTEGER NOT NULL,
+        failures INTEGER NOT NULL,
+        consecutive_failures INTEGER NOT NULL,
+        skipped INTEGER NOT NULL,
+        last_ms REAL,
+        p50_ms REAL,
+        p99_ms REAL,
+        last_error TEXT,
+        last_success INTEGER,
+        updated_at INTEGER NOT NULL
+    )
+    ''',
+]
+
+# Every known device with its latest sampling health, for the dashboard selector
+DEVICES_QUERY = '''
+    SELECT d.device_key, d.serial, d.model, d.device_name, d.updated_at,
+           m.samples, m.failures, m.consecutive_failures, m.skipped, m.last_ms, m.p50_ms, m.p99_ms,
+           m.last_error, m.last_success, m.updated_at
+    FROM devices d LEFT JOIN device_metrics m ON m.device_id = d.id
+    ORDER BY d.device_key
+'''
+
+
+# Stable identity for a device; the model/name pair until a serial is known
+def device_key(info, serial=None):
+    if serial:
+        return serial
+    return f"{info.get('Model', 'unknown')}/{info.get('Device name', 'unknown')}"
+
+
+def split_reading(info):
+    facts = {key: value for key, value in info.items() if key not in DYNAMIC_KEYS}
+    timestamp = info.get("Timestamp")
+    ts = int(datetime.strptime(timestamp, TIMESTAMP_FORMAT).timestamp()) if timestamp else int(time.time())
+    try:
+        level = int(info.get("Battery level"))
+    except (TypeError, ValueError):
+        level = None
+    return facts, ts, level
+
+
+class DeviceStore:
+    """Writes collector samples into device_data.db.
+
+    Static facts (model, processor, RAM, ...) live once per device in `devices`
+    and are only rewritten when they change; each sample adds one typed row to
+    `battery_readings`, keyed on (device_id, epoch ts) so re-imports are no-ops.
+    """
+
+    def __init__(self, path=DB_NAME):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=10)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        apply_migrations(self.conn, MIGRATIONS)
+        self._devices = {}  # device_key -> (id, facts json, serial)
+
+    def upsert_device(self, key, facts, serial=None):
+        encoded = json.dumps(facts, sort_keys=True, ensure_ascii=False)
+        cached = self._devices.get(key)
+        if cached and cached[1] == encoded and (serial is None or cached[2] == serial):
+            return cached[0]
+
+        self.conn.execute('''
+            INSERT INTO devices (device_key, about_device, device_name, model, processor, ram,
+                                 battery_capacity, facts, updated_at, serial)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(device_key) DO UPDATE SET
+                about_device = excluded.about_device,
+                device_name = excluded.device_name,
+                model = excluded.model,
+                processor = excluded.processor,
+                ram = excluded.ram,
+                battery_capacity = excluded.battery_capacity,
+                facts = excluded.facts,
+                updated_at = excluded.updated_at,
+                serial = COALESCE(excluded.serial, devices.serial)
+            WHERE devices.facts != excluded.facts OR excluded.serial IS NOT devices.serial
+        ''', (
+            key,
+            facts.get("About device"),
+            facts.get("Device name"),
+            facts.get("Model"),
+            facts.get("Processor"),
+            facts.get("RAM"),
+            facts.get("Battery capacity"),
+            encoded,
+            int(time.time()),
+            serial,
+        ))
+        device_id, serial = self.conn.execute(
+            'SELECT id, serial FROM devices WHERE device_key = ?', (key,)
+        ).fetchone()
+        self._devices[key] = (device_id, encoded, serial)
+        return device_id
+
+    def _insert(self, info, serial=None):
+        facts, ts, level = split_reading(info)
+        device_id = self.upsert_device(device_key(info, serial), facts, serial=serial)
+        self.conn.execute(
+            'INSERT OR IGNORE INTO battery_readings (device_id, ts, level) VALUES (?, ?, ?)',
+            (device_id, ts, level),
+        )
+        return device_id
+
+    # Store one collector sample (the dict uiautomator_deviceinfo.py builds)
+    def record(self, info, serial=None):
+        with self.conn:
+            return self._insert(info, serial)
+
+    def record_many(self, entries, serial=None):
+        with self.conn:
+            for info in entries:
+                self._insert(info, serial)
+        return len(entries)
+
+    # Add the readings of old collector samples to an existing device, leaving
+    # its stored facts alone (they are newer than the ones in the samples)
+    def import_readings(self, device_id, entries):
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO battery_readings (device_id, ts, level) VALUES (?, ?, ?)',
+                [(device_id,) + split_reading(info)[1:] for info in entries],
+            )
+        return len(entries)
+
+    # Cached static facts for an adb serial: (device id, facts) or None
+    def device_for_serial(self, serial):
+        row = self.conn.execute(
+            'SELECT id, facts FROM devices WHERE serial = ? ORDER BY updated_at DESC LIMIT 1', (serial,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    # Store one battery sample (see battery_sampler.parse_dumpsys_battery). Readings
+    # are keyed per second, so only the first sample within a second is kept.
+    def record_battery(self, device_id, sample, ts=None):
+        ts = int(time.time()) if ts is None else int(ts)
+        with self.conn:
+            cursor = self.conn.execute('''
+                INSERT OR IGNORE INTO battery_readings
+                    (device_id, ts, level, temperature, voltage, current, status, health, plugged)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                device_id,
+                ts,
+                sample.get("level"),
+                sample.get("temperature"),
+                sample.get("voltage"),
+                sample.get("current"),
+                sample.get("status"),
+                sample.get("health"),
+                sample.get("plugged"),
+            ))
+        return cursor.rowcount
+
+    # Upsert per-device sampling health: one dict per device, as built by
+    # fleet.DeviceStats.snapshot() plus its device_id
+    def save_metrics(self, metrics):
+        now = int(time.time())
+        with self.conn:
+            self.conn.executemany('''
+                INSERT INTO device_metrics (device_id, samples, failures, consecutive_failures, skipped,
+                                            last_ms, p50_ms, p99_ms, last_error, last_success, updated_at)
+                VALUES (:device_id, :samples, :failures, :consecutive_failures, :skipped,
+                        :last_ms, :p50_ms, :p99_ms, :last_error, :last_success, :updated_at)
+                ON CONFLICT(device_id) DO UPDATE SET
+                    samples = excluded.samples,
+                    failures = excluded.failures,
+                    consecutive_failures = excluded.consecutive_failures,
+                    skipped = excluded.skipped,
+                    last_ms = excluded.last_ms,
+                    p50_ms = excluded.p50_ms,
+                    p99_ms = excluded.p99_ms,
+                    last_error = excluded.last_error,
+                    last_success = excluded.last_success,
+                    updated_at = excluded.updated_at
+            ''', [dict(entry, updated_at=now) for entry in metrics])
+
+    def readings(self, device_id, start, end):
+        return self.conn.execute(
+            'SELECT ts, level FROM battery_readings WHERE device_id = ? AND ts >= ? AND ts < ? ORDER BY ts',
+            (device_id, int(start), int(end)),
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
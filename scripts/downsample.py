@@ -0,0 +1,151 @@
+import threading
+
+import numpy as np
+
+# Bucket widths (seconds) an aggregate query snaps to, so buckets line up across
+# queries and closed ones can be cached
+BUCKET_WIDTHS = (
+    60, 120, 300, 600, 900, 1800, 3600, 2 * 3600, 3 * 3600, 6 * 3600, 12 * 3600,
+    86400, 2 * 86400, 7 * 86400, 14 * 86400, 30 * 86400,
+)
+
+
+# Largest-Triangle-Three-Buckets: indices of the points that best preserve the shape
+def lttb_indices(x, y, max_points):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # Bucket boundaries for everything between the fixed first and last points
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_lo, next_hi = edges[i + 1], edges[i + 2]
+            avg_x = x[next_lo:next_hi].mean()
+            avg_y = y[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(area.argmax())
+        selected[i + 1] = previous
+
+    return selected
+
+
+def lttb(x, y, max_points):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    selected = lttb_indices(x, y, max_points)
+    return x[selected], y[selected]
+
+
+def pick_bucket_width(start, end, max_points):
+    span = max(end - start, 1)
+    for width in BUCKET_WIDTHS:
+        if span / width <= max_points:
+            return width
+    return BUCKET_WIDTHS[-1]
+
+
+# Min/max/avg/count per fixed-width bucket; empty buckets are left out
+def bucket_stats(x, y, start, width, count):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = start + width * np.arange(count + 1)
+    bounds = np.searchsorted(x, edges, side='left')
+    sizes = np.diff(bounds)
+    filled = np.nonzero(sizes)[0]
+    if len(filled) == 0 or len(y) == 0:
+        empty = np.empty(0)
+        return empty, empty, empty, empty, np.empty(0, dtype=np.int64)
+
+    starts = bounds[:-1][filled]
+    return (
+        edges[:-1][filled],
+        np.minimum.reduceat(y, starts),
+        np.maximum.reduceat(y, starts),
+        np.add.reduceat(y, starts) / sizes[filled],
+        sizes[filled],
+    )
+
+
+class BucketCache:
+    """Caches closed min/max/avg buckets keyed on (width, bucket start).
+
+    A bucket is closed once a reading newer than its end exists; its aggregate can
+    no longer change unless the history itself is rewritten, which callers signal
+    with a new `generation`.
+    """
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self._buckets = {}
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # `fetch(lo, hi)` returns the (times, values) arrays with lo <= time < hi. It is
+    # called once per run of consecutive buckets missing from the cache, so a live
+    # window whose closed buckets are cached only reads the still-open newest one.
+    def query(self, fetch, start, end, max_points, newest=None, generation=None):
+        width = pick_bucket_width(start, end, max_points)
+        first = int(start // width) * width
+        count = int(np.ceil((end - first) / width)) or 1
+
+        with self._lock:
+            if generation != self._generation:
+                self._buckets.clear()
+                self._generation = generation
+            cached = {}
+            for i in range(count):
+                key = (width, first + i * width)
+                if key in self._buckets:
+                    cached[i] = self._buckets[key]
+            self.hits += len(cached)
+            self.misses += count - len(cached)
+
+        computed = {}
+        missing = [i for i in range(count) if i not in cached]
+        runs = []
+        for i in missing:
+            if runs and runs[-1][1] == i:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+        for lo, hi in runs:
+            run_start = first + lo * width
+            x, y = fetch(run_start, first + hi * width)
+            times, lows, highs, means, sizes = bucket_stats(x, y, run_start, width, hi - lo)
+            computed.update(
+                (int((t - first) // width), (float(a), float(b), float(c), int(d)))
+                for t, a, b, c, d in zip(times, lows, highs, means, sizes)
+            )
+        if missing:
+            with self._lock:
+                if len(self._buckets) > self.max_entries:
+                    self._buckets.clear()
+                for i in missing:
+                    bucket_end = first + (i + 1) * width
+                    if newest is not None and newest >= bucket_end:
+                        self._buckets[(width, first + i * width)] = computed.get(i)
+
+        rows = []
+        for i in range(count):
+            value = cached[i] if i in cached else computed.get(i)
+            if value is not None:
+                rows.append((first + i * width,) + tuple(value))
+        return width, rows
@@ -0,0 +1,126 @@
+import random
+import threading
+import time
+from xml.sax.saxutils import quoteattr
+
+from battery_sampler import BATTERY_COMMAND, FINGERPRINT_COMMAND, ShellError
+
+
+class FakeProfile:
+    """How an emulated device behaves: shell latency (seconds, plus up to
+    `jitter`), the chance a command fails, and the chance it hangs past the
+    shell timeout."""
+
+    def __init__(self, latency=0.01, jitter=0.01, failure_rate=0.0, hang_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+
+
+class FakeShell:
+    """Stands in for `battery_sampler.ShellSession`, answering the commands the
+    collectors send with `dumpsys battery`-style output that slowly drains."""
+
+    def __init__(self, serial, profile, timeout=10.0):
+        self.serial = serial
+        self.profile = profile
+        self.timeout = timeout
+        self.level = random.randint(20, 100)
+        self.fingerprint = f"fake/{serial}:14/FAKE.1:user/release-keys"
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    def run(self, command, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            profile = self.profile
+            if random.random() < profile.hang_rate:
+                time.sleep(timeout)
+                raise TimeoutError(f"{command!r} took over {timeout}s")
+            time.sleep(profile.latency + random.random() * profile.jitter)
+            if random.random() < profile.failure_rate:
+                raise ShellError(f"error: device '{self.serial}' not found")
+            self.commands += 1
+            if command == FINGERPRINT_COMMAND:
+                return self.fingerprint + "\n"
+            if command == BATTERY_COMMAND:
+                if random.random() < 0.05:
+                    self.level = max(0, self.level - 1)
+                return (
+                    "Current Battery Service state:\n"
+                    "  AC powered: false\n  USB powered: true\n  Wireless powered: false\n"
+                    f"  status: 2\n  health: 2\n  level: {self.level}\n  scale: 100\n"
+                    f"  voltage: {3600 + self.level * 6}\n  temperature: {280 + random.randint(0, 60)}\n"
+                    f"current_now: {-random.randint(100000, 900000)}\n"
+                )
+            return ""
+
+    def close(self):
+        pass
+
+
+class _Selector:
+    def __init__(self, device):
+        self.scroll = self
+        self.device = device
+
+    def to(self, **kwargs):
+        return True
+
+    def click(self):
+        self.device.clicks += 1
+
+
+class FakeDevice:
+    """Just enough of a uiautomator2 device for `capture_device_facts`: the
+    Settings navigation succeeds and `dump_hierarchy` returns an About screen."""
+
+    def __init__(self, serial, model):
+        self.serial = serial
+        self.info = {"serial": serial}
+        self.model = model
+        self.clicks = 0
+
+    def __call__(self, **kwargs):
+        return _Selector(self)
+
+    def app_start(self, package):
+        pass
+
+    def app_stop(self, package):
+        pass
+
+    def dump_hierarchy(self):
+        texts = ["Device name", f"Fake {self.serial}", "Model", self.model,
+                 "Processor", "Octa-core", "RAM", "8 GB", "Battery capacity", "4500 mAh"]
+        nodes = "".join(f'<node class="android.widget.TextView" text={quoteattr(text)} />' for text in texts)
+        return f"<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">{nodes}</hierarchy>"
+
+
+class FakeBackend:
+    """A fleet of emulated devices for `fleet.FleetCollector`, with the same
+    interface as `fleet.AdbBackend`. `profiles` maps serials to a `FakeProfile`
+    (the rest use `default`), `timeout` is the shell timeout a hang runs into,
+    and `attached` can be changed at any time to emulate phones being plugged
+    in or removed."""
+
+    def __init__(self, count=4, profiles=None, default=None, timeout=10.0):
+        self.attached = [f"fake{i:02d}" for i in range(count)]
+        self.profiles = profiles or {}
+        self.default = default or FakeProfile()
+        self.timeout = timeout
+        self.connects = 0
+
+    def profile(self, serial):
+        return self.profiles.get(serial, self.default)
+
+    def list_devices(self):
+        return list(self.attached)
+
+    def shell(self, serial):
+        return FakeShell(serial, self.profile(serial), timeout=self.timeout)
+
+    def connect(self, serial):
+        self.connects += 1
+        return FakeDevice(serial, model=f"FK-{serial[-2:]}")
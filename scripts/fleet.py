@@ -0,0 +1,283 @@
+import argparse
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from battery_sampler import ShellError, ShellSession, read_battery, read_fingerprint
+from device_store import DB_NAME, DeviceStore
+from uiautomator_deviceinfo import FACTS_CHECK_INTERVAL, SAMPLE_INTERVAL, capture_device_facts
+
+# Seconds between `adb devices` scans for phones plugged in or removed
+DISCOVER_INTERVAL = 30
+
+# Seconds between writes of the per-device metrics to device_data.db
+METRICS_INTERVAL = 5
+
+# Longest a failing device waits between retries
+MAX_BACKOFF = 60
+
+
+# Serials of the attached devices that are online (state "device"; "offline"
+# and "unauthorized" ones can't be sampled)
+def list_devices(adb="adb", timeout=10):
+    output = subprocess.run([adb, "devices"], capture_output=True, text=True, timeout=timeout, check=True).stdout
+    serials = []
+    for line in output.splitlines()[1:]:
+        serial, _, state = line.strip().partition("\t")
+        if serial and state.strip() == "device":
+            serials.append(serial)
+    return serials
+
+
+class AdbBackend:
+    """Real devices: discovery through `adb devices`, a persistent adb shell and
+    a uiautomator2 connection per serial."""
+
+    def __init__(self, adb="adb"):
+        self.adb = adb
+
+    def list_devices(self):
+        return list_devices(self.adb)
+
+    def shell(self, serial):
+        return ShellSession(serial, adb=self.adb)
+
+    def connect(self, serial):
+        import uiautomator2 as u2
+        return u2.connect(serial)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class DeviceStats:
+    """Sampling health of one device: counts, recent latencies and the last error."""
+
+    def __init__(self, window=200):
+        self.samples = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.skipped = 0  # Ticks missed because the previous sample was still running
+        self.latencies = deque(maxlen=window)
+        self.last_error = None
+        self.last_success = None
+
+    def record(self, seconds, error=None):
+        self.latencies.append(seconds)
+        if error is None:
+            self.samples += 1
+            self.consecutive_failures = 0
+            self.last_success = int(time.time())
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+
+    def snapshot(self):
+        latencies = list(self.latencies)
+        return {
+            "samples": self.samples,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "skipped": self.skipped,
+            "last_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+            "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            "last_error": self.last_error,
+            "last_success": self.last_success,
+        }
+
+
+class FleetDevice:
+    """One attached phone: its shell, its uiautomator2 connection (opened the
+    first time the facts are read, then kept) and its sampling schedule."""
+
+    def __init__(self, serial, backend):
+        self.serial = serial
+        self.backend = backend
+        self.shell = backend.shell(serial)
+        self.device_id = None
+        self.fingerprint = None
+        self.next_due = 0.0
+        self.next_facts_check = 0.0
+        self.stats = DeviceStats()
+        self._connection = None
+
+    def connection(self):
+        if self._connection is None:
+            self._connection = self.backend.connect(self.serial)
+        return self._connection
+
+    # Runs on a worker thread: one battery sample, plus the static facts when the
+    # fingerprint check is due and finds a new build (or none stored yet)
+    def poll(self, check_facts):
+        sample = read_battery(self.shell)
+        facts = None
+        if check_facts:
+            fingerprint = read_fingerprint(self.shell)
+            if fingerprint != self.fingerprint or self.device_id is None:
+                facts = capture_device_facts(self.serial, device=self.connection())
+                if facts is None:
+                    raise ShellError("could not read the About device screen")
+                facts["Build fingerprint"] = fingerprint
+        return sample, facts
+
+    def close(self):
+        self.shell.close()
+
+
+class FleetCollector:
+    """Samples every attached device concurrently on a bounded worker pool.
+
+    Each device keeps its own schedule: it is handed to a worker when its next
+    sample is due and the previous one has finished, so a slow or hung phone
+    holds one worker (bounded by the shell timeout) while the rest keep their
+    cadence. Failing devices back off exponentially up to `MAX_BACKOFF`. Workers
+    only talk to devices; all database writes happen on the collector's thread.
+    Readings are stored keyed by serial, and per-device latency and failure
+    metrics are written to device_metrics every `METRICS_INTERVAL` seconds.
+    """
+
+    def __init__(self, store, backend=None, workers=8, interval=SAMPLE_INTERVAL,
+                 facts_check=FACTS_CHECK_INTERVAL, discover_interval=DISCOVER_INTERVAL):
+        self.store = store
+        self.backend = backend or AdbBackend()
+        self.workers = workers
+        self.interval = interval
+        self.facts_check = facts_check
+        self.discover_interval = discover_interval
+        self.devices = {}
+        self._next_discover = 0.0
+        self._next_metrics = 0.0
+
+    def discover(self):
+        try:
+            serials = set(self.backend.list_devices())
+        except (OSError, subprocess.SubprocessError) as e:
+            print(f"Device discovery failed: {e}")
+            return
+        for serial in serials - self.devices.keys():
+            device = FleetDevice(serial, self.backend)
+            cached = self.store.device_for_serial(serial)
+            if cached:
+                device.device_id, facts = cached
+                device.fingerprint = facts.get("Build fingerprint")
+            self.devices[serial] = device
+            print(f"Device {serial} attached")
+        for serial in self.devices.keys() - serials:
+            self.devices.pop(serial).close()
+            print(f"Device {serial} detached")
+
+    def _finish(self, device, future, seconds):
+        now = time.monotonic()
+        try:
+            sample, facts = future.result()
+        except Exception as e:
+            device.stats.record(seconds, f"{type(e).__name__}: {e}")
+            backoff = min(MAX_BACKOFF, self.interval * 2 ** device.stats.consecutive_failures)
+            device.next_due = now + backoff
+            print(f"{device.serial}: sample failed ({e}), retrying in {backoff:.0f}s")
+            return
+
+        if facts is not None:
+            with self.store.conn:
+                device.device_id = self.store.upsert_device(device.serial, facts, serial=device.serial)
+            device.fingerprint = facts["Build fingerprint"]
+            print(f"{device.serial}: facts saved ({facts.get('Model', 'unknown model')})")
+        if device.device_id is not None:
+            self.store.record_battery(device.device_id, sample)
+        device.stats.record(seconds)
+
+    def save_metrics(self):
+        self.store.save_metrics([
+            dict(device.stats.snapshot(), device_id=device.device_id)
+            for device in self.devices.values() if device.device_id is not None
+        ])
+
+    def stats(self):
+        return {serial: device.stats.snapshot() for serial, device in sorted(self.devices.items())}
+
+    # Sample until interrupted, or for `duration` seconds
+    def run(self, duration=None):
+        stop_at = None if duration is None else time.monotonic() + duration
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="device") as executor:
+            try:
+                while stop_at is None or time.monotonic() < stop_at:
+                    now = time.monotonic()
+                    if now >= self._next_discover:
+                        self.discover()
+                        self._next_discover = now + self.discover_interval
+
+                    busy = {device for device, _ in in_flight.values()}
+                    for device in sorted(self.devices.values(), key=lambda device: device.next_due):
+                        if device.next_due > now:
+                            break
+                        if device in busy:
+                            device.stats.skipped += 1
+                            device.next_due = now + self.interval
+                            continue
+                        if len(in_flight) >= self.workers:
+                            break
+                        check_facts = now >= device.next_facts_check or device.device_id is None
+                        if check_facts:
+                            device.next_facts_check = now + self.facts_check
+                        in_flight[executor.submit(device.poll, check_facts)] = (device, time.perf_counter())
+                        device.next_due = now + self.interval
+
+                    # Sleep until the next device is due, or with every worker busy, until one frees up
+                    wake = self._next_discover
+                    if len(in_flight) < self.workers:
+                        wake = min([wake] + [device.next_due for device in self.devices.values()])
+                    if stop_at is not None:
+                        wake = min(wake, stop_at)
+                    timeout = max(0.0, wake - time.monotonic())
+                    if in_flight:
+                        done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            device, submitted = in_flight.pop(future)
+                            if self.devices.get(device.serial) is device:
+                                self._finish(device, future, time.perf_counter() - submitted)
+                    else:
+                        time.sleep(timeout)
+
+                    if time.monotonic() >= self._next_metrics:
+                        self.save_metrics()
+                        self._next_metrics = time.monotonic() + METRICS_INTERVAL
+            finally:
+                # Workers still waiting on a device give up within the shell timeout
+                for device in self.devices.values():
+                    device.close()
+                self.save_metrics()
+        return self.stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect battery telemetry from every attached device")
+    parser.add_argument("--workers", type=int, default=8, help="devices sampled at once")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="seconds between samples per device")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--adb", default="adb")
+    parser.add_argument("--fake", type=int, metavar="N", help="sample N emulated devices (fake_devices.py) instead")
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_devices import FakeBackend
+        backend = FakeBackend(args.fake)
+    else:
+        backend = AdbBackend(args.adb)
+
+    store = DeviceStore(args.db)
+    collector = FleetCollector(store, backend, workers=args.workers, interval=args.interval)
+    try:
+        collector.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.close()
+    for serial, stats in collector.stats().items():
+        print(f"{serial}: {stats}")
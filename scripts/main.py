@@ -1,20 +1,26 @@
 import subprocess
 import os
-import json
 import sqlite3
-import plotly.graph_objs as go
-import plotly.io as pio
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import HTMLResponse, Response
 import uvicorn
 import sys
 import asyncio
+import hashlib
+import html
+import json
+import time
 from celery import Celery
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
-
-# FastAPI app setup
-app = FastAPI()
+from datetime import datetime
+import numpy as np
+from battery_hub import BatteryHub
+from timeseries_store import TableBatteryTimeSeries
+from db import apply_migrations, close_all, get_database
+from device_store import DEVICES_QUERY, MIGRATIONS as DEVICE_MIGRATIONS
+import apk_store
+import zebpay_store
+from downsample import BucketCache, lttb
 
 # Celery app setup
 celery_app = Celery(
@@ -29,108 +35,179 @@ ddb_path = os.path.join(os.getcwd(), 'device_data.db')
 adb_path = os.path.join(os.getcwd(), 'apk_metadata.db')
 crypto_db_path = os.path.join(os.getcwd(), 'zebpay_data.db')  # Crypto data DB path
 
+# Shared, pooled connections for the three databases the dashboard touches
+device_db = get_database(ddb_path)
+apk_db = get_database(adb_path)
+crypto_db = get_database(crypto_db_path)
+
+# Create/upgrade the tables the collectors write into
 def init_db():
     try:
-        conn = sqlite3.connect(ddb_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS device_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            about_device TEXT,
-            device_name TEXT,
-            model TEXT,
-            processor TEXT,
-            ram TEXT,
-            battery_capacity TEXT,
-            battery_level INTEGER,
-            timestamp TEXT
-        )
-        ''')
-        conn.commit()
+        with device_db.connection() as conn:
+            apply_migrations(conn, DEVICE_MIGRATIONS)
+        with apk_db.connection() as conn:
+            apply_migrations(conn, apk_store.MIGRATIONS)
+        with crypto_db.connection() as conn:
+            apply_migrations(conn, zebpay_store.MIGRATIONS)
+        if not device_db.fetch_one('SELECT 1 FROM battery_readings LIMIT 1') and os.path.exists(json_file_path):
+            print("device_data.db has no readings yet; import the old history with migrate_device_history.py")
     except sqlite3.Error as e:
         print(f"Error initializing database: {e}")
-    finally:
-        conn.close()
 
-def insert_into_db(data):
+# APK metadata table function; the file listing is only counted here and paged
+# in through /api/apks/{apk_id}/files
+async def get_latest_apk_metadata():
     try:
-        conn = sqlite3.connect(ddb_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT INTO device_info (about_device, device_name, model, processor, ram, battery_capacity, battery_level, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data.get("About device", "N/A"),
-            data.get("Device name", "N/A"),
-            data.get("Model", "N/A"),
-            data.get("Processor", "N/A"),
-            data.get("RAM", "N/A"),
-            data.get("Battery capacity", "N/A"),
-            int(data.get("Battery level", 0)),
-            data.get("Timestamp", "N/A")
-        ))
-        conn.commit()
-    except sqlite3.Error as e:
-        print(f"Error inserting data into database: {e}")
-    finally:
-        conn.close()
-
-# APK metadata table function
-def get_latest_apk_metadata():
-    try:
-        conn = sqlite3.connect(adb_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM apk_metadata ORDER BY id DESC LIMIT 1')
-        row = cursor.fetchone()
+        row = await apk_db.afetch_one(apk_store.LATEST_APK_QUERY)
         if row:
             return {
                 'package_name': row[1],
                 'version': row[2],
-                'permissions': row[3],
-                'activities': row[4],
-                'services': row[5],
-                'receivers': row[6],
-                'providers': row[7],
-                'files': row[8],
-                'timestamp': row[9]
+                'permissions': row[4] or '',
+                'activities': row[5] or '',
+                'services': row[6] or '',
+                'receivers': row[7] or '',
+                'providers': row[8] or '',
+                'files': f'<a href="/api/apks/{row[0]}/files">{row[9]} files</a>',
+                'timestamp': row[3]
             }
         else:
             return {}
     except sqlite3.Error as e:
         print(f"Error fetching data from APK metadata: {e}")
-    finally:
-        conn.close()
+        return {}
 
-# Function to fetch cryptocurrency data from SQLite
-def get_crypto_data():
+# Function to fetch the most recently updated quotes (one row per pair) from SQLite
+async def get_crypto_data():
     try:
-        conn = sqlite3.connect(crypto_db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM zebpay_data ORDER BY id DESC LIMIT 10')
-        rows = cursor.fetchall()
+        rows = await crypto_db.afetch_all('''
+            SELECT market, volumeEx, volumeQt, pricechange, quickTradePrice, pair, virtualCurrency, currency, volume
+            FROM zebpay_latest
+            ORDER BY fetched_at DESC, pair
+            LIMIT 10
+        ''')
         crypto_data = []
         for row in rows:
             crypto_data.append({
-                'market': row[1],
-                'volumeEx': row[2],
-                'volumeQt': row[3],
-                'pricechange': row[4],
-                'quickTradePrice': row[5],
-                'pair': row[6],
-                'virtualCurrency': row[7],
-                'currency': row[8],
-                'volume': row[9]
+                'market': row[0],
+                'volumeEx': row[1],
+                'volumeQt': row[2],
+                'pricechange': row[3],
+                'quickTradePrice': row[4],
+                'pair': row[5],
+                'virtualCurrency': row[6],
+                'currency': row[7],
+                'volume': row[8]
             })
         return crypto_data
     except sqlite3.Error as e:
         print(f"Error fetching cryptocurrency data: {e}")
         return []
-    finally:
-        conn.close()
 
 # Initialize the database on startup
 init_db()
 
+# Seconds of battery history the live chart shows and each view keeps in memory
+BATTERY_WINDOW = 2 * 60 * 60
+
+class DeviceView:
+    """Everything the dashboard keeps per device: the in-memory battery history
+    (followed as the collector appends readings), the battery producer shared by
+    that device's /ws clients, the bucket cache and the rendered page. `serial`
+    is a device_key; None is the default view, which stays on the device that had
+    reported most recently when the dashboard first found readings.
+    """
+
+    def __init__(self, serial=None):
+        self.serial = serial
+        self.store = TableBatteryTimeSeries(device_db, device_key=serial, retention=BATTERY_WINDOW)
+        self.hub = BatteryHub(self.build_window, interval=5, max_points=1000)
+        self.buckets = BucketCache()
+        self.render_cache = {"key": None, "etag": None, "html": None}
+        self.render_lock = asyncio.Lock()
+
+    # Read the battery window once per tick; the hub shares it with every /ws client
+    def build_window(self):
+        self.store.refresh()
+        timestamps, battery_levels, epochs = self.store.last(BATTERY_WINDOW)
+        return list(zip(timestamps, battery_levels, epochs))
+
+class DeviceDirectory:
+    """Every stored device with the fleet collector's metrics (`DEVICES_QUERY`
+    rows), re-read every `interval` seconds by a background task so page loads
+    and /api/devices serve them from memory. `version` is bumped whenever the
+    rows change, so the render cache is invalidated at most once per interval.
+    """
+
+    def __init__(self, interval=5):
+        self.interval = interval
+        self.rows = []
+        self.version = 0
+        self._task = None
+
+    async def refresh(self):
+        rows = await device_db.afetch_all(DEVICES_QUERY)
+        if rows != self.rows:
+            self.rows = rows
+            self.version += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except sqlite3.Error as e:
+                print(f"Error fetching the device list: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+device_directory = DeviceDirectory()
+
+# The default view, plus one per device selected on the dashboard
+device_views = {None: DeviceView()}
+
+# View for `serial`, created (and its producer started) the first time it is
+# asked for; None if no such device is stored
+async def get_device_view(serial=None):
+    serial = serial or None
+    view = device_views.get(serial)
+    if view is None:
+        if not await device_db.afetch_one('SELECT 1 FROM devices WHERE device_key = ?', (serial,)):
+            return None
+        view = device_views.get(serial)
+        if view is None:
+            view = device_views[serial] = DeviceView(serial)
+            view.hub.start()
+            await asyncio.to_thread(view.store.refresh)
+    return view
+
+# Run the battery producers for the lifetime of the server
+@asynccontextmanager
+async def lifespan(app):
+    default_view = device_views[None]
+    default_view.store.refresh()
+    default_view.hub.start()
+    device_directory.start()
+    yield
+    await device_directory.stop()
+    for view in list(device_views.values()):
+        await view.hub.stop()
+    close_all()
+
+# FastAPI app setup
+app = FastAPI(lifespan=lifespan)
+
 # HTML Template for displaying device information, battery insights, APK analysis, and crypto data
 html_template = """
 <!DOCTYPE html>
@@ -156,6 +233,10 @@ html_template = """
 <body>
     <div class="container">
         <h1>Device Information</h1>
+        <form method="get" action="/">
+            <label for="serial"><strong>Device:</strong></label>
+            <select id="serial" name="serial" onchange="this.form.submit()">{device_options}</select>
+        </form>
         <div class="info-box">
             <p><strong>About device:</strong> {about_device}</p>
             <p><strong>Device Name:</strong> {device_name}</p>
@@ -165,6 +246,25 @@ html_template = """
             <p><strong>Battery Capacity:</strong> {battery_capacity}</p>
         </div>
         
+        <h2>Devices</h2>
+        <div class="table-box">
+            <table>
+                <tr>
+                    <th>Device</th>
+                    <th>Samples</th>
+                    <th>Failures</th>
+                    <th>Failing Streak</th>
+                    <th>Skipped</th>
+                    <th>Last (ms)</th>
+                    <th>p50 (ms)</th>
+                    <th>p99 (ms)</th>
+                    <th>Last Sample</th>
+                    <th>Last Error</th>
+                </tr>
+                {device_rows}
+            </table>
+        </div>
+
         <h2>Battery Insights</h2>
         <div class="graph-box">
             <div id="batteryGraph"></div>
@@ -215,173 +315,430 @@ html_template = """
                 {crypto_rows}
             </table>
         </div>
+        <div class="graph-box">
+            <div id="cryptoCandles"></div>
+        </div>
     </div>
     <script>
-        var ws = new WebSocket("ws://localhost:8000/ws");
-
-        // Variables to store the current zoom state
-        var currentXRange = null;
-        var currentYRange = null;
-
-        ws.onmessage = function(event) {{
-            var data = JSON.parse(event.data);
-
-            // Initialize the graph only once
-            if (!currentXRange && !currentYRange) {{
-                Plotly.newPlot('batteryGraph', data.data, {{
-                    title: 'Battery Level Over Time',
-                    hovermode: 'closest',
-                    xaxis: {{
-                        title: 'Time',
-                        tickangle: 45,
-                    }},
-                    yaxis: {{
-                        title: 'Battery Level (%)'
-                    }},
-                }});
-            }} else {{
-                // Update data while preserving the zoom state
-                Plotly.update('batteryGraph', data.data, {{
-                    xaxis: {{ range: currentXRange }},
-                    yaxis: {{ range: currentYRange }},
-                }});
-            }}
+        // Battery stream protocol v2: one snapshot, then deltas appended with extendTraces;
+        // each delta's cutoff drops points that have left the window
+        var serial = {serial};
+        var epoch = null;
+        var lastSeq = null;
+        var plotted = false;
+
+        var layout = {{
+            title: 'Battery Level Over Time',
+            hovermode: 'closest',
+            xaxis: {{ title: 'Time', tickangle: 45 }},
+            uirevision: 'battery',  // keep the user's zoom/pan across redraws
+            yaxis: {{ title: 'Battery Level (%)' }},
+        }};
 
-            var graphDiv = document.getElementById('batteryGraph');
-
-            // Save the zoom/pan state on interaction (e.g., zoom or pan)
-            graphDiv.on('plotly_relayout', function(eventData) {{
-                currentXRange = eventData['xaxis.range'] || currentXRange;
-                currentYRange = eventData['yaxis.range'] || currentYRange;
-            }});
-
-            // Double-click to reset zoom to the original state
-            graphDiv.on('plotly_doubleclick', function(eventData) {{
-                currentXRange = null;
-                currentYRange = null;
-                Plotly.relayout('batteryGraph', {{
-                    'xaxis.autorange': true,
-                    'yaxis.autorange': true
+        function drawSnapshot(msg) {{
+            var trace = {{
+                x: msg.x,
+                y: msg.y,
+                mode: 'lines+markers',
+                name: 'Battery Level',
+                marker: {{ color: 'blue' }},
+                hoverinfo: 'x+y',
+                line: {{ shape: 'linear' }},
+            }};
+            Plotly.react('batteryGraph', [trace], layout);
+            plotted = true;
+        }}
+
+        function connect() {{
+            var params = [];
+            if (serial !== null) {{
+                params.push("serial=" + encodeURIComponent(serial));
+            }}
+            if (epoch !== null && lastSeq !== null) {{
+                params.push("epoch=" + encodeURIComponent(epoch), "cursor=" + lastSeq);
+            }}
+            var url = "ws://" + location.host + "/ws" + (params.length ? "?" + params.join("&") : "");
+            var ws = new WebSocket(url);
+
+            ws.onmessage = function(event) {{
+                var msg = JSON.parse(event.data);
+                if (msg.v !== 2) {{
+                    return;
+                }}
+                if (msg.type === 'snapshot' || !plotted) {{
+                    drawSnapshot(msg);
+                }} else if (msg['from'] === lastSeq) {{
+                    // Keep the plotted points at or after the cutoff, plus the new ones;
+                    // timestamps are zero-padded so they compare as strings
+                    var plottedX = document.getElementById('batteryGraph').data[0].x;
+                    var expired = 0;
+                    while (expired < plottedX.length && plottedX[expired] < msg.cutoff) {{
+                        expired++;
+                    }}
+                    Plotly.extendTraces('batteryGraph', {{ x: [msg.x], y: [msg.y] }}, [0],
+                                        plottedX.length - expired + msg.x.length);
+                }} else {{
+                    // Out of step with the server, reconnect without a cursor for a fresh snapshot
+                    lastSeq = null;
+                    ws.close();
+                    return;
+                }}
+                epoch = msg.epoch;
+                lastSeq = msg.seq;
+            }};
+
+            ws.onclose = function() {{
+                setTimeout(connect, 2000);
+            }};
+        }}
+
+        connect();
+
+        // Hourly candles for the most recently quoted pair, last 7 days
+        var candlePair = {candle_pair};
+        if (candlePair) {{
+            var since = Math.floor(Date.now() / 1000) - 7 * 24 * 3600;
+            fetch('/api/crypto/candles?interval=1h&pair=' + encodeURIComponent(candlePair) + '&start=' + since)
+                .then(function(response) {{ return response.json(); }})
+                .then(function(c) {{
+                    if (!c.start.length) {{
+                        return;
+                    }}
+                    Plotly.newPlot('cryptoCandles', [{{
+                        type: 'candlestick',
+                        x: c.start.map(function(t) {{ return new Date(t * 1000); }}),
+                        open: c.open, high: c.high, low: c.low, close: c.close,
+                        name: candlePair,
+                    }}], {{
+                        title: candlePair + ' (1h)',
+                        xaxis: {{ title: 'Time', rangeslider: {{ visible: false }} }},
+                        yaxis: {{ title: 'Quick Trade Price' }},
+                    }});
                 }});
-            }});
-        }};
+        }}
     </script>
 </body>
 </html>
 """
 
+# Modification state of everything the dashboard is rendered from. Device readings
+# come from the in-memory store, which the battery hub keeps current, and the
+# device list (with its metrics) from device_directory; neither touches SQLite.
+def source_state(view):
+    state = [view.store.version, device_directory.version]
+    for path in (adb_path, adb_path + '-wal', crypto_db_path, crypto_db_path + '-wal'):
+        try:
+            stat = os.stat(path)
+            state.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            state.append(None)
+    return tuple(state)
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+# Device selector options and the per-device sampling health table
+def device_sections(devices, selected):
+    options = []
+    rows = []
+    for key, serial, model, device_name, _, samples, failures, consecutive, skipped, last_ms, p50_ms, p99_ms, \
+            last_error, last_success, _ in devices:
+        label = html.escape(f"{key} ({model or device_name or 'unknown'})")
+        options.append('<option value="%s"%s>%s</option>' % (
+            html.escape(key, quote=True), ' selected' if key == selected else '', label))
+        if samples is None:
+            continue
+        last_seen = format_timestamp(last_success) if last_success else "never"
+        cells = [label, samples, failures, consecutive, skipped, last_ms, p50_ms, p99_ms, last_seen,
+                 html.escape(last_error or "")]
+        rows.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+    return "".join(options), "".join(rows)
+
+async def render_dashboard(view, devices):
+    latest_entry = view.store.latest
+
+    about_device = latest_entry.get("About device", "N/A")
+    device_name = latest_entry.get("Device name", "N/A")
+    model = latest_entry.get("Model", "N/A")
+    processor = latest_entry.get("Processor", "N/A")
+    ram = latest_entry.get("RAM", "N/A")
+    battery_capacity = latest_entry.get("Battery capacity", "N/A")
+
+    # Get APK metadata
+    apk_metadata = await get_latest_apk_metadata()
+
+    # Get cryptocurrency data
+    crypto_data = await get_crypto_data()
+
+    crypto_rows = ''.join([
+        f"<tr><td>{row['market']}</td><td>{row['volumeEx']}</td><td>{row['volumeQt']}</td><td>{row['pricechange']}</td><td>{row['quickTradePrice']}</td><td>{row['pair']}</td><td>{row['virtualCurrency']}</td><td>{row['currency']}</td><td>{row['volume']}</td></tr>"
+        for row in crypto_data
+    ])
+
+    device_options, device_rows = device_sections(devices, view.serial or view.store.device_key)
+
+    html_content = html_template.format(
+        device_options=device_options,
+        device_rows=device_rows,
+        serial=json.dumps(view.serial).replace('<', '\\u003c'),
+        about_device=about_device,
+        device_name=device_name,
+        model=model,
+        processor=processor,
+        ram=ram,
+        battery_capacity=battery_capacity,
+        package_name=apk_metadata.get("package_name", "N/A"),
+        version=apk_metadata.get("version", "N/A"),
+        permissions=apk_metadata.get("permissions", "N/A"),
+        activities=apk_metadata.get("activities", "N/A"),
+        services=apk_metadata.get("services", "N/A"),
+        receivers=apk_metadata.get("receivers", "N/A"),
+        providers=apk_metadata.get("providers", "N/A"),
+        files=apk_metadata.get("files", "N/A"),
+        timestamp=apk_metadata.get("timestamp", "N/A"),
+        crypto_rows=crypto_rows,  # Adding the crypto rows here
+        candle_pair=json.dumps(crypto_data[0]['pair'] if crypto_data else None).replace('<', '\\u003c'),
+    )
+
+    return html_content
+
 # Endpoint to get the device info, battery insights, APK analysis, and cryptocurrency data
 @app.get("/", response_class=HTMLResponse)
-async def get_device_info():
+async def get_device_info(request: Request, serial: str = None):
     try:
-        with open(json_file_path, 'r') as json_file:
-            data = json.load(json_file)
-
-        latest_entry = data[-1] if isinstance(data, list) else data
-
-        insert_into_db(latest_entry)
-
-        about_device = latest_entry.get("About device", "N/A")
-        device_name = latest_entry.get("Device name", "N/A")
-        model = latest_entry.get("Model", "N/A")
-        processor = latest_entry.get("Processor", "N/A")
-        ram = latest_entry.get("RAM", "N/A")
-        battery_capacity = latest_entry.get("Battery capacity", "N/A")
-
-        # Get APK metadata
-        apk_metadata = get_latest_apk_metadata()
-
-        # Get cryptocurrency data
-        crypto_data = get_crypto_data()
-
-        crypto_rows = ''.join([
-            f"<tr><td>{row['market']}</td><td>{row['volumeEx']}</td><td>{row['volumeQt']}</td><td>{row['pricechange']}</td><td>{row['quickTradePrice']}</td><td>{row['pair']}</td><td>{row['virtualCurrency']}</td><td>{row['currency']}</td><td>{row['volume']}</td></tr>"
-            for row in crypto_data
-        ])
-
-        html_content = html_template.format(
-            about_device=about_device,
-            device_name=device_name,
-            model=model,
-            processor=processor,
-            ram=ram,
-            battery_capacity=battery_capacity,
-            package_name=apk_metadata.get("package_name", "N/A"),
-            version=apk_metadata.get("version", "N/A"),
-            permissions=apk_metadata.get("permissions", "N/A"),
-            activities=apk_metadata.get("activities", "N/A"),
-            services=apk_metadata.get("services", "N/A"),
-            receivers=apk_metadata.get("receivers", "N/A"),
-            providers=apk_metadata.get("providers", "N/A"),
-            files=apk_metadata.get("files", "N/A"),
-            timestamp=apk_metadata.get("timestamp", "N/A"),
-            crypto_rows=crypto_rows  # Adding the crypto rows here
-        )
-
-        return HTMLResponse(content=html_content)
+        view = await get_device_view(serial)
+        if view is None:
+            return HTMLResponse(content=f"Unknown device {html.escape(serial)}", status_code=404)
+        devices = device_directory.rows
+        key = source_state(view)
+        render_cache = view.render_cache
+        if render_cache["key"] != key:
+            # Only one request re-renders; the rest of a refresh storm waits for it
+            async with view.render_lock:
+                if render_cache["key"] != key:
+                    html_content = await render_dashboard(view, devices)
+                    etag = '"' + hashlib.sha1(html_content.encode('utf-8')).hexdigest()[:20] + '"'
+                    render_cache.update(key=key, etag=etag, html=html_content)
+
+        headers = {"ETag": render_cache["etag"], "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), render_cache["etag"]):
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(content=render_cache["html"], headers=headers)
 
     except Exception as e:
         return HTMLResponse(content=f"Error: {str(e)}", status_code=500)
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, epoch: str = None, cursor: int = None, serial: str = None):
     await websocket.accept()
 
-    while True:
+    try:
+        view = await get_device_view(serial)
+        if view is None:
+            return
+        # Clients reconnecting with their last epoch/cursor only receive what they missed
+        await view.hub.serve(websocket, epoch, cursor)
+    except Exception as e:
+        print(f"WebSocket Error: {e}")
+    finally:
         try:
-            with open(json_file_path, 'r') as json_file:
-                data = json.load(json_file)
-
-            current_time = datetime.now()
-            two_hours_ago = current_time - timedelta(hours=24)
-
-            filtered_data = [
-                entry for entry in data
-                if datetime.strptime(entry["Timestamp"], "%Y-%m-%d %H:%M:%S") >= two_hours_ago
-            ]
-
-            timestamps = [entry["Timestamp"] for entry in filtered_data]
-            battery_levels = [int(entry["Battery level"]) for entry in filtered_data]
-
-            if len(timestamps) == 0 or len(battery_levels) == 0:
-                print("No data for the past 2 hours, waiting for current data...")
-                await asyncio.sleep(60) 
-                continue  
-
-            trace = go.Scatter(
-                x=timestamps,
-                y=battery_levels,
-                mode='lines+markers',
-                name='Battery Level',
-                marker=dict(color='blue'),
-                hoverinfo='x+y',
-                line=dict(shape='linear')
-            )
-
-            layout = go.Layout(
-                title="Battery Level Over Time (Past 2 Hours)",
-                xaxis=dict(title='Time', tickangle=45),
-                yaxis=dict(title='Battery Level (%)'),
-                hovermode='closest'
-            )
-
-            figure_json = pio.to_json({'data': [trace], 'layout': layout})
-
-            await websocket.send_text(figure_json)
-
-            await asyncio.sleep(5)
-
-        except Exception as e:
-            print(f"WebSocket Error: {e}")
             await websocket.close()
-            break
+        except RuntimeError:
+            pass  # Already closed by the client
+
+def format_timestamp(epoch):
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S")
+
+# Battery readings with start <= time < end as numpy arrays, unknown levels dropped
+def battery_columns(view, start, end):
+    times, levels = view.store.columns(start, end)
+    x = np.array(times, dtype=np.float64)
+    y = np.array(levels, dtype=np.float64)
+    known = y >= 0
+    return x[known], y[known]
+
+def query_battery(view, start, end, max_points, mode):
+    if mode == "lttb":
+        x, y = lttb(*battery_columns(view, start, end), max_points)
+        return {
+            "mode": mode,
+            "x": [format_timestamp(t) for t in x],
+            "y": y.astype(int).tolist(),
+        }
+
+    width, rows = view.buckets.query(
+        lambda start, end: battery_columns(view, start, end), start, end, max_points,
+        newest=view.store.newest(), generation=view.store.generation,
+    )
+    return {
+        "mode": mode,
+        "bucket_seconds": width,
+        "x": [format_timestamp(row[0]) for row in rows],
+        "min": [row[1] for row in rows],
+        "max": [row[2] for row in rows],
+        "avg": [round(row[3], 2) for row in rows],
+        "count": [row[4] for row in rows],
+    }
+
+# Battery history for any window, reduced to at most `max_points` points
+# (LTTB) or buckets (min/max/avg); start/end are epoch seconds
+@app.get("/api/battery")
+async def battery_history(start: float = None, end: float = None, max_points: int = 500, mode: str = "lttb",
+                          serial: str = None):
+    if mode not in ("lttb", "buckets"):
+        return Response(content="mode must be 'lttb' or 'buckets'", status_code=400)
+    view = await get_device_view(serial)
+    if view is None:
+        return Response(content="unknown device", status_code=404)
+    end = time.time() if end is None else end
+    start = end - 24 * 60 * 60 if start is None else start
+    max_points = max(3, min(max_points, 5000))
+    return await asyncio.to_thread(query_battery, view, start, end, max_points, mode)
+
+# Quote history for one pair (epoch seconds), served from the (pair, fetched_at) index
+@app.get("/api/crypto/history")
+async def crypto_history(pair: str, start: float = 0, end: float = None):
+    end = time.time() if end is None else end
+    rows = await crypto_db.afetch_all(
+        zebpay_store.PAIR_HISTORY_QUERY, {"pair": pair, "start": int(start), "end": int(end)}
+    )
+    return {
+        "pair": pair,
+        "fetched_at": [row[0] for row in rows],
+        "price": [row[1] for row in rows],
+        "price_change": [row[2] for row in rows],
+        "volume": [row[3] for row in rows],
+    }
+
+# OHLCV candles for one pair, read straight from the materialized candle table
+@app.get("/api/crypto/candles")
+async def crypto_candles(pair: str, interval: str = "1h", start: float = 0, end: float = None):
+    if interval not in zebpay_store.CANDLE_WIDTHS:
+        return Response(content=f"interval must be one of {', '.join(zebpay_store.CANDLE_WIDTHS)}", status_code=400)
+    end = time.time() if end is None else end
+    rows = await crypto_db.afetch_all(
+        zebpay_store.CANDLE_QUERY, (pair, zebpay_store.CANDLE_WIDTHS[interval], int(start), int(end))
+    )
+    return {
+        "pair": pair,
+        "interval": interval,
+        "start": [row[0] for row in rows],
+        "open": [row[1] for row in rows],
+        "high": [row[2] for row in rows],
+        "low": [row[3] for row in rows],
+        "close": [row[4] for row in rows],
+        "volume": [row[5] for row in rows],
+    }
+
+# Full market state at a point in time (epoch seconds), from the snapshots or the change log
+@app.get("/api/crypto/snapshot")
+async def crypto_snapshot(at: float = None):
+    at = time.time() if at is None else at
+
+    def rebuild():
+        with crypto_db.connection() as conn:
+            return zebpay_store.reconstruct(conn, at)
+
+    market = await asyncio.to_thread(rebuild)
+    return {"at": int(at), "pairs": len(market), "market": market}
+
+# Every stored build that requests a permission (or with heads_only, the newest
+# build of each package), via the permission index
+@app.get("/api/apks")
+async def apks_with_permission(permission: str, heads_only: bool = False):
+    rows = await asyncio.to_thread(with_apk_store, apk_store.ApkStore.with_permission, permission, heads_only)
+    return {
+        "permission": permission,
+        "apks": [{"id": row[0], "package_name": row[1], "version": row[2]} for row in rows],
+    }
+
+# Stored builds of one package, oldest first
+@app.get("/api/apks/history")
+async def apk_history(package: str):
+    rows = await apk_db.afetch_all(apk_store.PACKAGE_HISTORY_QUERY, (package,))
+    return {
+        "package_name": package,
+        "builds": [{"id": row[0], "version": row[1], "analyzed_at": row[2], "delta": row[3] is not None}
+                   for row in rows],
+    }
+
+def with_apk_store(method, *args):
+    with apk_db.connection() as conn:
+        return method(apk_store.ApkStore(conn), *args)
+
+# One page of an APK's file listing; pass the returned `next` as `after` for the following page
+@app.get("/api/apks/{apk_id}/files")
+async def apk_files(apk_id: int, after: int = 0, limit: int = 500):
+    limit = max(1, min(limit, 5000))
+    rows = await asyncio.to_thread(with_apk_store, apk_store.ApkStore.files, apk_id, after, limit)
+    return {
+        "apk_id": apk_id,
+        "files": [
+            {"name": row[1], "size": row[2], "compressed_size": row[3], "crc": row[4]}
+            for row in rows
+        ],
+        "next": rows[-1][0] if len(rows) == limit else None,
+    }
+
+# Permissions, components and files that changed between two stored builds
+@app.get("/api/apks/{old_id}/diff/{new_id}")
+async def apk_diff(old_id: int, new_id: int):
+    changes = await asyncio.to_thread(with_apk_store, apk_store.ApkStore.diff, old_id, new_id)
+    if changes is None:
+        return Response(content="unknown apk id", status_code=404)
+    return {"from": old_id, "to": new_id, "changes": changes}
+
+# Every stored device with the fleet collector's latency and failure metrics,
+# as last read by device_directory
+@app.get("/api/devices")
+async def list_devices():
+    rows = device_directory.rows
+    return [
+        {
+            "serial": row[0],
+            "model": row[2],
+            "device_name": row[3],
+            "facts_updated_at": row[4],
+            "metrics": None if row[5] is None else {
+                "samples": row[5],
+                "failures": row[6],
+                "consecutive_failures": row[7],
+                "skipped": row[8],
+                "last_ms": row[9],
+                "p50_ms": row[10],
+                "p99_ms": row[11],
+                "last_error": row[12],
+                "last_success": row[13],
+                "updated_at": row[14],
+            },
+        }
+        for row in rows
+    ]
+
+# Subscriber counts and tick timings for each device's battery stream
+@app.get("/ws/stats")
+async def websocket_stats():
+    return {serial or "default": view.hub.stats() for serial, view in device_views.items()}
+
+# Per-query timings for each pooled database
+@app.get("/db/stats")
+async def database_stats():
+    return {
+        "device_data": device_db.stats(),
+        "apk_metadata": apk_db.stats(),
+        "zebpay_data": crypto_db.stats(),
+    }
 
 # Start the mobile automation script as a subprocess
 def run_mobile_automation():
     subprocess.Popen([sys.executable, "mobile_automation.py"])
 
-def run_uiautomator_deviceinfo():
-    subprocess.Popen([sys.executable, "uiautomator_deviceinfo.py"])
+# Collect from every attached phone (uiautomator_deviceinfo.py still covers a single one)
+def run_fleet():
+    subprocess.Popen([sys.executable, "fleet.py"])
 
 def run_zeb():
     subprocess.Popen([sys.executable, "zeb.py"])
@@ -389,6 +746,6 @@ def run_zeb():
 
 if __name__ == "__main__":
     run_mobile_automation()  # Launch mobile automation as a subprocess
-    run_uiautomator_deviceinfo()  # Launch uiautomator_deviceinfo as a subprocess
+    run_fleet()  # Launch the device fleet collector as a subprocess
     run_zeb() # Launch zebpay crypto script as a subprocess
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
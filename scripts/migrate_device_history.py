@@ -0,0 +1,40 @@
+import argparse
+import time
+
+from device_store import DB_NAME, DeviceStore
+from timeseries_store import BatteryTimeSeries
+
+
+# One-shot import of the legacy device_info.json history into device_data.db.
+# Safe to re-run: readings are keyed on (device, timestamp) and duplicates are skipped.
+# With `serial` the history is stored under that adb serial, joining the device
+# the collectors write to; if that device is already stored its facts are kept.
+def migrate(json_path, db_path=DB_NAME, serial=None):
+    store = DeviceStore(db_path)
+    cached = store.device_for_serial(serial) if serial else None
+    imported = []
+
+    def write(entries):
+        if cached:
+            imported.append(store.import_readings(cached[0], entries))
+        else:
+            imported.append(store.record_many(entries, serial=serial))
+
+    started = time.perf_counter()
+    # The tailing reader copes with the collector's pretty-printed, cp1252-tainted output
+    history = BatteryTimeSeries(json_path, on_append=write)
+    history.refresh()
+    store.close()
+
+    total = sum(imported)
+    print(f"Processed {total} readings from {json_path} into {db_path} in {time.perf_counter() - started:.2f}s")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import device_info.json into device_data.db")
+    parser.add_argument("json_path", nargs="?", default="device_info.json")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--serial", help="adb serial of the phone the history came from")
+    args = parser.parse_args()
+    migrate(args.json_path, args.db, args.serial)
@@ -0,0 +1,184 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+# Candidate proxies from a local file: one `host:port` or `scheme://host:port` per
+# line, `#` starts a comment. Returned as requests-style proxy dicts.
+def load_candidates(path, scheme="https"):
+    candidates = []
+    seen = set()
+    with open(path, 'r') as candidate_file:
+        for line in candidate_file:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            url = line if "://" in line else f"http://{line}"
+            if url not in seen:
+                seen.add(url)
+                candidates.append({scheme: url})
+    return candidates
+
+
+# Fetch `target` once through `proxy` with strict timeouts and measure it. `throttle`,
+# if given, is called first and blocks until the request may go out (e.g. a host
+# token bucket's `wait`); it isn't counted in the latency.
+def validate_proxy(proxy, target, connect_timeout=3, read_timeout=5, expect_json=True, headers=None,
+                   throttle=None):
+    result = {"proxy": proxy, "ok": False, "latency": None, "bytes": 0, "throughput": None, "error": None}
+    if throttle is not None:
+        throttle()
+    started = time.perf_counter()
+    try:
+        with requests.Session() as session:
+            response = session.get(
+                target, proxies=proxy, headers=headers, timeout=(connect_timeout, read_timeout), verify=False
+            )
+            body = response.content
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        if expect_json and 'application/json' not in response.headers.get('Content-Type', ''):
+            raise ValueError("non-JSON reply")
+        result.update(
+            ok=True,
+            latency=elapsed,
+            bytes=len(body),
+            throughput=len(body) / elapsed if elapsed else None,
+        )
+    except (requests.RequestException, ValueError) as e:
+        result["error"] = str(e)
+    return result
+
+
+# Validate every candidate concurrently; returns the working ones fastest first
+# and the full list of results
+def validate_all(candidates, target, concurrency=200, **options):
+    results = []
+    if not candidates:
+        return [], results
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(candidates))) as executor:
+        futures = [executor.submit(validate_proxy, proxy, target, **options) for proxy in candidates]
+        for future in as_completed(futures):
+            results.append(future.result())
+    working = sorted((result for result in results if result["ok"]), key=lambda result: result["latency"])
+    return working, results
+
+
+class ProxyDiscovery:
+    """Re-validates candidate proxies in the background and feeds the pool.
+
+    Every `interval` seconds the candidates from `candidates_path` plus the
+    proxies already in `pool` are checked against `target`; working ones are
+    handed to the pool fastest first, with their measured latency as a seed.
+    A pooled proxy that fails counts as a failure in the pool, and after
+    `evict_after` failed rounds in a row it is removed from the pool (a later
+    round that finds it working adds it back). With a `bucket` (a
+    `scheduler.TokenBucket` of its own, not the scraper's host bucket) every
+    validation request takes a token from it, which caps how hard a round hits
+    the target without delaying the scraper's polls.
+    """
+
+    def __init__(self, pool, candidates_path, target, interval=600, concurrency=200, bucket=None,
+                 evict_after=3, **options):
+        self.pool = pool
+        self.bucket = bucket
+        self.evict_after = evict_after
+        self.missed = {}  # Consecutive failed rounds per pooled proxy
+        self.candidates_path = candidates_path
+        self.target = target
+        # Candidates are keyed like the pool's proxy dicts: by the target's scheme
+        self.scheme = urlparse(target).scheme or "https"
+        self.interval = interval
+        self.concurrency = concurrency
+        self.options = options
+        self.last_results = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def candidates(self):
+        candidates = self.pool.all()
+        if self.candidates_path and os.path.exists(self.candidates_path):
+            known = {self.pool.key(proxy) for proxy in candidates}
+            candidates += [
+                proxy for proxy in load_candidates(self.candidates_path, self.scheme) if self.pool.key(proxy) not in known
+            ]
+        return candidates
+
+    def run_once(self):
+        started = time.perf_counter()
+        pooled = {self.pool.key(proxy) for proxy in self.pool.all()}
+        candidates = self.candidates()
+        options = dict(self.options)
+        if self.bucket is not None:
+            options["throttle"] = self.bucket.wait
+        working, results = validate_all(candidates, self.target, self.concurrency, **options)
+        for result in working:
+            self.pool.seed(result["proxy"], result["latency"])
+            self.missed.pop(self.pool.key(result["proxy"]), None)
+
+        evicted = 0
+        for result in results:
+            key = self.pool.key(result["proxy"])
+            if result["ok"] or key not in pooled:
+                continue
+            self.pool.record_failure(result["proxy"])
+            self.missed[key] = self.missed.get(key, 0) + 1
+            if self.missed[key] >= self.evict_after:
+                self.pool.remove(result["proxy"])
+                del self.missed[key]
+                evicted += 1
+        self.last_results = results
+        print(
+            f"Validated {len(candidates)} proxies in {time.perf_counter() - started:.1f}s: "
+            f"{len(working)} working, {evicted} evicted"
+        )
+        return working
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Proxy discovery error: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="proxy-discovery", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate candidate proxies against a target URL")
+    parser.add_argument("candidates", help="file with one host:port per line")
+    parser.add_argument("--target", default="https://www.zebapi.com/pro/v1/market/")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--connect-timeout", type=float, default=3)
+    parser.add_argument("--read-timeout", type=float, default=5)
+    args = parser.parse_args()
+
+    working, results = validate_all(
+        load_candidates(args.candidates, urlparse(args.target).scheme or "https"),
+        args.target,
+        args.concurrency,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+    )
+    for result in working:
+        print(f"{next(iter(result['proxy'].values()))}  {result['latency'] * 1000:.0f} ms  "
+              f"{result['throughput'] / 1024:.1f} KiB/s")
+    print(f"{len(working)}/{len(results)} proxies working")
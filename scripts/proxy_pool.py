@@ -0,0 +1,235 @@
+import json
+import os
+import random
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ProxyHealth:
+    """Rolling health of one proxy plus its circuit breaker state."""
+
+    def __init__(self, key, latency=None, success_rate=1.0, successes=0, failures=0,
+                 consecutive_failures=0, last_failure=None, state=CLOSED, opened_at=None, cooldown=None):
+        self.key = key
+        self.latency = latency              # EWMA of successful fetch latency, seconds
+        self.success_rate = success_rate    # EWMA of 1/0 outcomes
+        self.successes = successes
+        self.failures = failures
+        self.consecutive_failures = consecutive_failures
+        self.last_failure = last_failure
+        self.state = state
+        self.opened_at = opened_at
+        self.cooldown = cooldown
+        self.probing = False
+
+    # No request has gone through it yet (a validation seed doesn't count)
+    def untried(self):
+        return self.successes == 0 and self.failures == 0
+
+    def score(self, default_latency):
+        # Expected seconds per good reply: slow or flaky proxies both rank lower
+        latency = self.latency if self.latency is not None else default_latency
+        return latency / max(self.success_rate, 0.05)
+
+    def to_dict(self):
+        return {
+            "latency": self.latency,
+            "success_rate": self.success_rate,
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "last_failure": self.last_failure,
+            "state": self.state,
+            "opened_at": self.opened_at,
+            "cooldown": self.cooldown,
+        }
+
+
+class ProxyPool:
+    """Routes requests to the fastest healthy proxies.
+
+    Each proxy keeps an EWMA of its latency and success rate. After
+    `failure_threshold` consecutive failures its breaker opens and it gets no
+    traffic for `cooldown` seconds; then a single half-open probe is let through.
+    A good probe closes the breaker, a bad one reopens it with the cooldown
+    doubled (up to `max_cooldown`). Scores are saved to `state_path` so a restart
+    doesn't have to rediscover which proxies are dead; scores of proxies not in
+    the pool yet are kept for when discovery adds them.
+
+    Untried proxies would otherwise never outrank a proxy with a good score, so
+    they are explored: when more than one proxy is picked the last slot goes to
+    a random untried one, and a single pick does so with probability `explore`.
+    """
+
+    def __init__(self, proxies, state_path=None, alpha=0.3, failure_threshold=3,
+                 cooldown=60.0, max_cooldown=900.0, default_latency=5.0, explore=0.1):
+        self.proxies = {self.key(proxy): proxy for proxy in proxies}
+        self.state_path = state_path
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.default_latency = default_latency
+        self.explore = explore
+        self.health = {key: ProxyHealth(key) for key in self.proxies}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self.load()
+
+    @staticmethod
+    def key(proxy):
+        return next(iter(proxy.values()))
+
+    def add(self, proxy):
+        key = self.key(proxy)
+        with self._lock:
+            self.proxies[key] = proxy
+            self.health.setdefault(key, ProxyHealth(key))
+
+    # Take a proxy out of rotation; its health is kept (and saved) in case it returns
+    def remove(self, proxy):
+        with self._lock:
+            self.proxies.pop(self.key(proxy), None)
+
+    def all(self):
+        with self._lock:
+            return list(self.proxies.values())
+
+    # Fold an out-of-band validation result in (see proxy_discovery.py): new proxies
+    # join the pool, and a tripped breaker gets its probe straight away
+    def seed(self, proxy, latency):
+        key = self.key(proxy)
+        with self._lock:
+            self.proxies[key] = proxy
+            health = self.health.setdefault(key, ProxyHealth(key))
+            health.latency = latency if health.latency is None else (
+                self.alpha * latency + (1 - self.alpha) * health.latency
+            )
+            if health.state == OPEN:
+                health.state = HALF_OPEN
+
+    def _usable(self, health, now):
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and now - health.opened_at >= health.cooldown:
+            health.state = HALF_OPEN
+        return health.state == HALF_OPEN and not health.probing
+
+    # Up to `count` proxies to try next, best first, skipping `exclude`
+    def pick(self, count, exclude=()):
+        now = time.time()
+        with self._lock:
+            excluded = {self.key(proxy) for proxy in exclude}
+            usable = [
+                health for key, health in self.health.items()
+                if key in self.proxies and key not in excluded and self._usable(health, now)
+            ]
+            usable.sort(key=lambda health: (health.state != CLOSED, health.score(self.default_latency)))
+            untried = [health for health in usable if health.state == CLOSED and health.untried()]
+            if untried and count > 0 and (count > 1 or random.random() < self.explore):
+                explorer = random.choice(untried)
+                usable.remove(explorer)
+                usable.insert(min(count - 1, len(usable)), explorer)
+            chosen = []
+            for health in usable:
+                if len(chosen) >= count:
+                    break
+                if health.state == HALF_OPEN:
+                    # One probe at a time decides whether the proxy comes back
+                    if any(h.state == HALF_OPEN for h in chosen):
+                        continue
+                    health.probing = True
+                chosen.append(health)
+            return [self.proxies[health.key] for health in chosen]
+
+    def record_success(self, proxy, latency):
+        with self._lock:
+            health = self.health[self.key(proxy)]
+            health.latency = latency if health.latency is None else (
+                self.alpha * latency + (1 - self.alpha) * health.latency
+            )
+            health.success_rate = self.alpha + (1 - self.alpha) * health.success_rate
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.state = CLOSED
+            health.cooldown = None
+            health.probing = False
+            self._touch()
+
+    def record_failure(self, proxy):
+        now = time.time()
+        with self._lock:
+            health = self.health[self.key(proxy)]
+            health.success_rate = (1 - self.alpha) * health.success_rate
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.last_failure = now
+            if health.state == HALF_OPEN:
+                health.cooldown = min((health.cooldown or self.base_cooldown) * 2, self.max_cooldown)
+                health.state = OPEN
+                health.opened_at = now
+            elif health.state == CLOSED and health.consecutive_failures >= self.failure_threshold:
+                health.cooldown = self.base_cooldown
+                health.state = OPEN
+                health.opened_at = now
+            health.probing = False
+            self._touch()
+
+    # A probe that was picked but never ran (e.g. cancelled) must not block the proxy
+    def release(self, proxy):
+        with self._lock:
+            self.health[self.key(proxy)].probing = False
+
+    def _touch(self):
+        self._dirty += 1
+        if self._dirty >= 20:
+            self._save()
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r') as state_file:
+                saved = json.load(state_file)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable proxy scores in {self.state_path}: {e}")
+            return
+        for key, values in saved.items():
+            self.health[key] = ProxyHealth(key, **values)
+
+    def _save(self):
+        self._dirty = 0
+        if not self.state_path:
+            return
+        data = {key: health.to_dict() for key, health in self.health.items()}
+        temp_path = self.state_path + ".tmp"
+        try:
+            with open(temp_path, 'w') as state_file:
+                json.dump(data, state_file, indent=2)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            print(f"Error while saving proxy scores: {e}")
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def stats(self):
+        with self._lock:
+            ranked = sorted((health for key, health in self.health.items() if key in self.proxies),
+                            key=lambda health: health.score(self.default_latency))
+            return [
+                {
+                    "proxy": health.key,
+                    "state": health.state,
+                    "latency_ms": round(health.latency * 1000, 1) if health.latency is not None else None,
+                    "success_rate": round(health.success_rate, 3),
+                    "successes": health.successes,
+                    "failures": health.failures,
+                }
+                for health in ranked
+            ]
@@ -0,0 +1,172 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from segment_log import read_concatenated_json, read_records
+
+
+# Recorded market replies, from a segment log directory or a legacy
+# zebpay_data.json dump; each is the raw JSON body the API returned
+def load_payloads(source, prefix="zebpay"):
+    records = read_records(source, prefix) if os.path.isdir(source) else read_concatenated_json(source)
+    payloads = [json.dumps(record["response"], separators=(',', ':')).encode('utf-8') for record in records]
+    if not payloads:
+        raise ValueError(f"No recorded responses in {source}")
+    return payloads
+
+
+class ProxyProfile:
+    """How one emulated proxy behaves.
+
+    Each request waits `latency` seconds (plus up to `jitter`), then with the
+    given probabilities fails with a 502, hangs for `hang` seconds without
+    answering (long enough to hit the client's read timeout), or answers with an
+    HTML block page instead of JSON. Otherwise it replays the next recording.
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, timeout_rate=0.0, html_rate=0.0, hang=30.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.html_rate = html_rate
+        self.hang = hang
+
+    def __repr__(self):
+        return (f"ProxyProfile(latency={self.latency}, jitter={self.jitter}, error_rate={self.error_rate}, "
+                f"timeout_rate={self.timeout_rate}, html_rate={self.html_rate})")
+
+
+def _handler(server):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        # Plain HTTP forward-proxy requests arrive as `GET http://host/path`; the
+        # target is ignored and the next recording is served as if from the API
+        def do_GET(self):
+            profile = server.profile
+            time.sleep(profile.latency + random.uniform(0, profile.jitter))
+            roll = random.random()
+            if roll < profile.timeout_rate:
+                server.count("timeouts")
+                time.sleep(profile.hang)
+                return
+            roll -= profile.timeout_rate
+            if roll < profile.error_rate:
+                server.count("errors")
+                self._send(502, b"Bad Gateway", "text/plain")
+                return
+            roll -= profile.error_rate
+            if roll < profile.html_rate:
+                server.count("html")
+                self._send(200, b"<html><body>Access denied</body></html>", "text/html")
+                return
+            server.count("replies")
+            self._send(200, server.next_payload(), "application/json")
+
+        def _send(self, status, body, content_type):
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+
+class ReplayProxy(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, payloads, profile, host="127.0.0.1", port=0):
+        self.profile = profile
+        self._payloads = itertools.cycle(payloads)
+        self._lock = threading.Lock()
+        self.counts = {"replies": 0, "errors": 0, "timeouts": 0, "html": 0}
+        super().__init__((host, port), _handler(self))
+
+    def next_payload(self):
+        with self._lock:
+            return next(self._payloads)
+
+    def count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class ReplayFarm:
+    """A set of local `ReplayProxy` servers, one per profile, plus `dead` proxy
+    addresses that refuse connections outright.
+
+    `proxies()` returns requests-style proxy dicts for a plain-HTTP target such
+    as `REPLAY_URL`, ready to hand to a `ProxyPool`.
+    """
+
+    def __init__(self, payloads, profiles, dead=0, host="127.0.0.1"):
+        self.servers = [ReplayProxy(payloads, profile, host) for profile in profiles]
+        self.dead = []
+        for _ in range(dead):
+            # Bind and release a port so nothing is listening on it
+            probe = ThreadingHTTPServer((host, 0), BaseHTTPRequestHandler)
+            self.dead.append(f"http://{host}:{probe.server_address[1]}")
+            probe.server_close()
+        self._threads = []
+
+    def start(self):
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever, name=f"replay-{server.url}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def proxies(self):
+        return [{"http": server.url} for server in self.servers] + [{"http": url} for url in self.dead]
+
+    def counts(self):
+        return {server.url: dict(server.counts) for server in self.servers}
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+
+# Any plain-HTTP URL works as the target; the emulated proxies never resolve it
+REPLAY_URL = "http://zebpay.replay/pro/v1/market/"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded ZebPay replies through emulated proxies")
+    parser.add_argument("source", nargs="?", default="zebpay_data.json",
+                        help="zebpay_data.json dump or segment log directory")
+    parser.add_argument("--proxies", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--html-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    profile = ProxyProfile(args.latency, args.jitter, args.error_rate, args.timeout_rate, args.html_rate)
+    farm = ReplayFarm(load_payloads(args.source), [profile] * args.proxies).start()
+    for proxy in farm.proxies():
+        print(f"Replaying through {proxy['http']} ({profile})")
+    print(f"Target URL: {REPLAY_URL}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        farm.stop()
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average, in bursts of up to `capacity`.
+
+    Shared between the event loop (`acquire`) and worker threads (`wait`).
+    """
+
+    def __init__(self, rate, capacity=1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until `count` tokens are available (0 if they are now)
+    def delay(self, count=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            missing = count - self.tokens
+            return missing / self.rate if missing > 0 else 0.0
+
+    def try_acquire(self, count=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens < count:
+                return False
+            self.tokens -= count
+            return True
+
+    async def acquire(self, count=1):
+        while not self.try_acquire(count):
+            await asyncio.sleep(self.delay(count))
+
+    # Blocking `acquire` for worker threads
+    def wait(self, count=1):
+        while not self.try_acquire(count):
+            time.sleep(self.delay(count))
+
+
+class RateLimiter:
+    """Token buckets for the target host and for each proxy.
+
+    Every request through any proxy costs one host token, so hedged and retried
+    requests count against the host's budget too; each proxy also has its own
+    bucket so one fast proxy doesn't carry all the traffic and get banned.
+    """
+
+    def __init__(self, host_rate, host_burst=1, proxy_rate=None, proxy_burst=1):
+        self.host = TokenBucket(host_rate, host_burst)
+        self.proxy_rate = proxy_rate
+        self.proxy_burst = proxy_burst
+        self.proxies = {}
+
+    def proxy_bucket(self, key):
+        if key not in self.proxies:
+            self.proxies[key] = TokenBucket(self.proxy_rate, self.proxy_burst)
+        return self.proxies[key]
+
+    # Keys out of `keys` whose proxy bucket is empty right now
+    def throttled(self, keys):
+        if self.proxy_rate is None:
+            return []
+        return [key for key in keys if self.proxy_bucket(key).delay() > 0]
+
+    # Seconds until any of `keys` can be used again
+    def next_ready(self, keys):
+        if self.proxy_rate is None or not keys:
+            return 0.0
+        return min(self.proxy_bucket(key).delay() for key in keys)
+
+    def take(self, keys):
+        if self.proxy_rate is not None:
+            for key in keys:
+                self.proxy_bucket(key).try_acquire()
+
+    def stats(self):
+        return {
+            "host_tokens": round(self.host.tokens, 2),
+            "throttled_proxies": len(self.throttled(list(self.proxies))),
+        }
+
+
+class PollSchedule:
+    """Target cadence for fresh snapshots, with catch-up after failures.
+
+    A poll is due `interval` seconds after the previous one started. A failed
+    poll is retried after `retry_delay`, doubling on each further failure but
+    never waiting longer than the cadence itself, so a run of bad proxies costs
+    at most one missed snapshot rather than a fixed sleep per attempt. Slots
+    missed while falling behind are not made up in a burst; the next poll simply
+    starts at once.
+    """
+
+    def __init__(self, interval, retry_delay=0.5):
+        self.interval = interval
+        self.retry_delay = retry_delay
+        self.next_due = time.monotonic()
+        self.consecutive_failures = 0
+        self.polls = 0
+        self.missed = 0
+        self.last_success = None
+
+    async def wait(self):
+        delay = self.next_due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        started = time.monotonic()
+        self.polls += 1
+        return started
+
+    def record(self, started, ok):
+        now = time.monotonic()
+        if ok:
+            self.consecutive_failures = 0
+            self.last_success = now
+            self.next_due = started + self.interval
+            if now > self.next_due:
+                self.missed += int((now - started) // self.interval)
+        else:
+            self.consecutive_failures += 1
+            backoff = self.retry_delay * 2 ** (self.consecutive_failures - 1)
+            self.next_due = now + min(backoff, self.interval)
+
+    # Seconds since the last good snapshot, or None before the first one
+    def staleness(self):
+        return None if self.last_success is None else time.monotonic() - self.last_success
+
+    def stats(self):
+        staleness = self.staleness()
+        return {
+            "polls": self.polls,
+            "consecutive_failures": self.consecutive_failures,
+            "missed_slots": self.missed,
+            "staleness_s": round(staleness, 1) if staleness is not None else None,
+        }
@@ -0,0 +1,231 @@
+import argparse
+import datetime
+import gzip
+import io
+import json
+import os
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SUFFIX = ".ndjson"
+COMPRESSED_SUFFIXES = {".zst": "zstd", ".gz": "gzip"}
+
+
+def _default_compression():
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def _compress(path, compression):
+    suffix = ".zst" if compression == "zstd" else ".gz"
+    target = path + suffix
+    temp_path = target + ".tmp"
+    with open(path, 'rb') as source:
+        if compression == "zstd":
+            with open(temp_path, 'wb') as raw:
+                zstandard.ZstdCompressor(level=10).copy_stream(source, raw)
+        else:
+            with gzip.open(temp_path, 'wb') as compressed:
+                while chunk := source.read(1 << 20):
+                    compressed.write(chunk)
+    os.replace(temp_path, target)
+    os.remove(path)
+    return target
+
+
+class SegmentLog:
+    """Append-only NDJSON log split into rotated, compressed segments.
+
+    Each record is written as one compact JSON line to the open segment
+    `<prefix>-<start time>-<seq>.ndjson` in `directory`. Once the segment holds
+    `max_bytes` or is `max_age` seconds old a new one is started and the old one
+    is compressed (zstd if available, else gzip; `compression=None` keeps it
+    plain). Segments sort by name in write order, so `read_records` can stream
+    the whole archive back oldest first.
+    """
+
+    def __init__(self, directory, prefix="log", max_bytes=16 * 1024 * 1024, max_age=24 * 3600,
+                 compression="auto"):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compression = _default_compression() if compression == "auto" else compression
+        if self.compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        self._file = None
+        self._path = None
+        self._opened_at = None
+        self._size = 0
+        self._seq = 0
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def segments(self):
+        return segment_paths(self.directory, self.prefix)
+
+    # Pick up where a previous run stopped: keep appending to its open segment if it
+    # still has room, and compress any other plain segments it left behind
+    def _recover(self):
+        paths = self.segments()
+        if paths:
+            self._seq = _segment_seq(paths[-1]) + 1
+        plain = [path for path in paths if path.endswith(SUFFIX)]
+        for path in plain[:-1]:
+            self._finish(path)
+        if plain and plain[-1] == paths[-1]:
+            path = plain[-1]
+            size = os.path.getsize(path)
+            if size < self.max_bytes and time.time() - _segment_started(path) < self.max_age:
+                self._open(path, size, opened_at=_segment_started(path))
+            else:
+                self._finish(path)
+
+    def _open(self, path, size=0, opened_at=None):
+        self._file = open(path, 'ab')
+        self._path = path
+        self._size = size
+        self._opened_at = time.time() if opened_at is None else opened_at
+
+    def _finish(self, path):
+        if self.compression:
+            return _compress(path, self.compression)
+        return path
+
+    def _start_segment(self):
+        stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+        self._open(os.path.join(self.directory, f"{self.prefix}-{stamp}-{self._seq:06d}{SUFFIX}"))
+        self._seq += 1
+
+    def rotate(self):
+        if self._file is None:
+            return None
+        self._file.close()
+        path = self._path
+        self._file = None
+        self._path = None
+        return self._finish(path)
+
+    def append(self, record):
+        if self._file is not None and (
+            self._size >= self.max_bytes or time.time() - self._opened_at >= self.max_age
+        ):
+            self.rotate()
+        if self._file is None:
+            self._start_segment()
+        line = json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b"\n"
+        self._file.write(line)
+        self._file.flush()
+        self._size += len(line)
+        self.records += 1
+        return len(line)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _segment_seq(path):
+    name = os.path.basename(path)
+    return int(name.split('-')[-1].split('.')[0])
+
+
+def _segment_started(path):
+    stamp = os.path.basename(path).rsplit('-', 2)[-2]
+    return datetime.datetime.strptime(stamp, "%Y%m%dT%H%M%S").timestamp()
+
+
+def segment_paths(directory, prefix="log"):
+    if not os.path.isdir(directory):
+        return []
+    paths = []
+    for name in os.listdir(directory):
+        if not name.startswith(prefix + "-") or name.endswith(".tmp"):
+            continue
+        if name.endswith(SUFFIX) or any(name.endswith(SUFFIX + suffix) for suffix in COMPRESSED_SUFFIXES):
+            paths.append(os.path.join(directory, name))
+    return sorted(paths, key=_segment_seq)
+
+
+def _open_segment(path):
+    extension = os.path.splitext(path)[1]
+    if COMPRESSED_SUFFIXES.get(extension) == "zstd":
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed but zstandard is not installed")
+        raw = open(path, 'rb')
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    if COMPRESSED_SUFFIXES.get(extension) == "gzip":
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+# Stream every record from the segments in `directory`, oldest first, one line
+# at a time. A torn last line from a crash mid-write is skipped.
+def read_records(directory, prefix="log"):
+    for path in segment_paths(directory, prefix):
+        with _open_segment(path) as segment:
+            for line in segment:
+                if not line.endswith(b"\n"):
+                    break
+                yield json.loads(line)
+
+
+# Stream the records out of a legacy file of concatenated (pretty-printed) JSON
+# documents, as written by the old save_data_immediately, chunk by chunk
+def read_concatenated_json(path, chunk_size=1 << 20):
+    decoder = json.JSONDecoder()
+    buffer = ""
+    with open(path, 'r', encoding='utf-8') as legacy_file:
+        while True:
+            chunk = legacy_file.read(chunk_size)
+            buffer += chunk
+            position = 0
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                try:
+                    record, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    break
+                yield record
+                position = end
+            buffer = buffer[position:]
+            if not chunk:
+                if buffer.strip():
+                    print(f"Ignoring {len(buffer)} trailing characters of incomplete JSON in {path}")
+                return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or build an NDJSON segment log")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="convert a concatenated JSON dump into segments")
+    import_parser.add_argument("source")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--prefix", default="log")
+
+    cat_parser = subparsers.add_parser("cat", help="print every record as one JSON line")
+    cat_parser.add_argument("directory")
+    cat_parser.add_argument("--prefix", default="log")
+
+    args = parser.parse_args()
+    if args.command == "import":
+        started = time.perf_counter()
+        log = SegmentLog(args.directory, prefix=args.prefix)
+        for legacy_record in read_concatenated_json(args.source):
+            log.append(legacy_record)
+        log.rotate()
+        size = sum(os.path.getsize(path) for path in log.segments())
+        print(
+            f"Imported {log.records} records from {args.source} "
+            f"({os.path.getsize(args.source):,} bytes) into {size:,} bytes in {time.perf_counter() - started:.2f}s"
+        )
+    else:
+        for log_record in read_records(args.directory, args.prefix):
+            print(json.dumps(log_record, separators=(',', ':'), ensure_ascii=False))
@@ -0,0 +1,312 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Bytes before the resume offset that must be unchanged for a tail read to be trusted
+FINGERPRINT_SIZE = 64
+
+
+# Invalid UTF-8 (e.g. a cp1252 non-breaking space) survives tokenizing as a lone
+# surrogate; turn it into U+FFFD before the record leaves the store
+def _clean(value):
+    if isinstance(value, str):
+        return value.encode('utf-8', errors='surrogateescape').decode('utf-8', errors='replace')
+    return value
+
+
+class BatteryTimeSeries:
+    """In-memory battery history that follows `device_info.json` as it grows.
+
+    The collector rewrites the file as one pretty-printed JSON array, but every
+    rewrite keeps the old records byte-for-byte and only adds objects before the
+    closing bracket. So we remember where the last parsed object ended and, on
+    refresh, decode only what comes after it. If the bytes in front of that offset
+    change (or the file shrinks) the file is reloaded from the top.
+
+    Readings live in parallel array-backed columns sorted by time, so a window
+    query is two binary searches plus a slice.
+
+    `on_append`, if given, is called with the list of newly parsed records after
+    every refresh that found any, outside the store's lock.
+    """
+
+    def __init__(self, path, on_append=None):
+        self.path = path
+        self.on_append = on_append
+        self.times = array('d')   # epoch seconds
+        self.levels = array('h')  # battery level, -1 when unknown
+        self.labels = []          # original timestamp strings, for chart axes
+        self.latest = {}
+        self.version = 0          # bumped whenever the contents change
+        self.generation = 0       # bumped when already-seen history changes
+        self._offset = 0
+        self._fingerprint = b""
+        self._stat = None
+        self._decoder = json.JSONDecoder()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.times)
+
+    def _reset(self):
+        self.times = array('d')
+        self.levels = array('h')
+        self.labels = []
+        self.latest = {}
+        self._offset = 0
+        self._fingerprint = b""
+
+    def _append(self, entry):
+        label = entry.get("Timestamp")
+        if not label:
+            return False
+        try:
+            epoch = datetime.strptime(label, TIMESTAMP_FORMAT).timestamp()
+        except ValueError:
+            return False
+        try:
+            level = int(entry.get("Battery level"))
+        except (TypeError, ValueError):
+            level = -1
+        self._add(epoch, level, label)
+        self.latest = entry
+        return True
+
+    def _add(self, epoch, level, label):
+        if not self.times or epoch >= self.times[-1]:
+            self.times.append(epoch)
+            self.levels.append(level)
+            self.labels.append(label)
+        else:
+            # Rare out-of-order record: keep the columns sorted
+            self.generation += 1
+            index = bisect_right(self.times, epoch)
+            insort(self.times, epoch)
+            self.levels.insert(index, level)
+            self.labels.insert(index, label)
+
+    def _can_resume(self, handle, size):
+        if self._offset == 0 or size < self._offset:
+            return False
+        start = self._offset - len(self._fingerprint)
+        handle.seek(start)
+        return handle.read(len(self._fingerprint)) == self._fingerprint
+
+    # Pick up records appended since the last call; returns how many were added
+    def refresh(self):
+        added = self._refresh()
+        if added and self.on_append is not None:
+            self.on_append(added)
+        return len(added)
+
+    def _refresh(self):
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return []
+            key = (stat.st_mtime_ns, stat.st_size)
+            if key == self._stat:
+                return []
+
+            with open(self.path, 'rb') as handle:
+                if not self._can_resume(handle, stat.st_size):
+                    if self._offset:
+                        self.version += 1
+                        self.generation += 1
+                    self._reset()
+                handle.seek(self._offset)
+                raw = handle.read()
+
+            text = raw.decode('utf-8', errors='surrogateescape')
+            added = []
+            position = 0
+            consumed = 0
+            while position < len(text):
+                char = text[position]
+                if char in ' \t\r\n,[':
+                    position += 1
+                    continue
+                if char == ']':
+                    break
+                try:
+                    entry, position = self._decoder.raw_decode(text, position)
+                except json.JSONDecodeError:
+                    # The writer is mid-rewrite; try again on the next refresh
+                    stat = None
+                    break
+                if isinstance(entry, dict):
+                    entry = {_clean(key): _clean(value) for key, value in entry.items()}
+                if isinstance(entry, dict) and self._append(entry):
+                    added.append(entry)
+                consumed = position
+
+            if added:
+                self.version += 1
+            if consumed:
+                consumed_bytes = len(text[:consumed].encode('utf-8', errors='surrogateescape'))
+                self._fingerprint = (self._fingerprint + raw[:consumed_bytes])[-FINGERPRINT_SIZE:]
+                self._offset += consumed_bytes
+            self._stat = key if stat is not None else None
+            return added
+
+    # Readings with start <= time <= end, as (labels, levels, epochs); O(log n + k)
+    def window(self, start, end=None):
+        with self._lock:
+            lo = bisect_left(self.times, start)
+            hi = len(self.times) if end is None else bisect_right(self.times, end)
+            return self.labels[lo:hi], self.levels[lo:hi].tolist(), self.times[lo:hi].tolist()
+
+    # Raw columns with start <= time < end, copied so callers can hand them to numpy
+    def columns(self, start, end):
+        with self._lock:
+            lo = bisect_left(self.times, start)
+            hi = bisect_left(self.times, end)
+            return self.times[lo:hi], self.levels[lo:hi]
+
+    def newest(self):
+        with self._lock:
+            return self.times[-1] if self.times else None
+
+    def last(self, seconds):
+        return self.window(time.time() - seconds)
+
+
+class TableBatteryTimeSeries(BatteryTimeSeries):
+    """The same in-memory columns, fed from the `battery_readings` table.
+
+    Rows are append-only with increasing ids, so a refresh only selects rows past
+    the last id it has seen. `database` is a `db.Database`; `device_key` picks a
+    device. Without one, the series pins itself to whichever device reported most
+    recently when it first finds readings and stays on it: with several
+    collectors running, "most recent" changes with nearly every sample.
+
+    With `retention` (seconds), readings older than that are dropped from memory
+    on every refresh, so a 1 Hz collector doesn't grow the columns forever, and
+    the first refresh loads only that window; `columns()` reads ranges before
+    the retained window from the table instead.
+    """
+
+    def __init__(self, database, device_key=None, on_append=None, retention=None):
+        super().__init__(database.path, on_append=on_append)
+        self.database = database
+        self.device_key = device_key
+        self.retention = retention
+        self.device_id = None
+        self._last_id = 0
+        self._facts_updated = None
+        self._evicted_before = None  # Nothing older than this is held in memory
+
+    def _reset(self):
+        super()._reset()
+        self._last_id = 0
+        self._facts_updated = None
+        self._evicted_before = None
+
+    def _evict(self):
+        cutoff = time.time() - self.retention
+        count = bisect_left(self.times, cutoff)
+        if count:
+            del self.times[:count]
+            del self.levels[:count]
+            del self.labels[:count]
+        self._evicted_before = cutoff
+
+    # First load with a retention: only the retained window, found through the
+    # (device_id, ts) index, instead of every row the device ever stored. Later
+    # refreshes tail by id from the newest id seen here.
+    def _seed(self, device_id):
+        last_id = self.database.fetch_one('SELECT MAX(id) FROM battery_readings')[0]
+        if last_id is None:
+            return []
+        self._evicted_before = time.time() - self.retention
+        rows = self.database.fetch_all(
+            'SELECT id, ts, level FROM battery_readings WHERE device_id = ? AND ts >= ? AND id <= ? ORDER BY ts',
+            (device_id, self._evicted_before, last_id),
+        )
+        self._last_id = last_id
+        return rows
+
+    def _current_device(self):
+        if self.device_key is None:
+            row = self.database.fetch_one(
+                'SELECT d.device_key FROM battery_readings r JOIN devices d ON d.id = r.device_id '
+                'ORDER BY r.id DESC LIMIT 1'
+            )
+            if row is None:
+                return None
+            self.device_key = row[0]
+        row = self.database.fetch_one('SELECT id FROM devices WHERE device_key = ?', (self.device_key,))
+        return row[0] if row else None
+
+    def _refresh(self):
+        with self._lock:
+            try:
+                device_id = self._current_device()
+            except sqlite3.Error:
+                return []  # Tables not created yet
+            if device_id is None:
+                return []
+            if device_id != self.device_id:
+                if self.device_id is not None:
+                    self.version += 1
+                    self.generation += 1
+                self._reset()
+                self.device_id = device_id
+
+            if self._last_id == 0 and self.retention is not None:
+                rows = self._seed(device_id)
+            else:
+                rows = self.database.fetch_all(
+                    'SELECT id, ts, level FROM battery_readings WHERE device_id = ? AND id > ? ORDER BY id',
+                    (device_id, self._last_id),
+                )
+            facts = self.database.fetch_one('SELECT facts, updated_at FROM devices WHERE id = ?', (device_id,))
+            if not rows and (facts is None or facts[1] == self._facts_updated):
+                return []
+
+            added = []
+            for row_id, ts, level in rows:
+                self._last_id = max(self._last_id, row_id)
+                if self._evicted_before is not None and ts < self._evicted_before:
+                    continue  # Late reading for an evicted range; columns() reads it from the table
+                label = datetime.fromtimestamp(ts).strftime(TIMESTAMP_FORMAT)
+                self._add(float(ts), -1 if level is None else level, label)
+                added.append({"Battery level": level, "Timestamp": label})
+            if self.retention is not None:
+                self._evict()
+
+            if facts is not None:
+                self._facts_updated = facts[1]
+                latest = json.loads(facts[0])
+                if self.labels:
+                    latest["Battery level"] = self.levels[-1]
+                    latest["Timestamp"] = self.labels[-1]
+                self.latest = latest
+            self.version += 1
+            return added
+
+    def columns(self, start, end):
+        with self._lock:
+            evicted_before = self._evicted_before
+            device_id = self.device_id
+            lo = bisect_left(self.times, start if evicted_before is None else max(start, evicted_before))
+            hi = bisect_left(self.times, end)
+            times, levels = self.times[lo:hi], self.levels[lo:hi]
+        if evicted_before is None or start >= evicted_before or device_id is None:
+            return times, levels
+
+        rows = self.database.fetch_all(
+            'SELECT ts, level FROM battery_readings WHERE device_id = ? AND ts >= ? AND ts < ? ORDER BY ts',
+            (device_id, start, min(end, evicted_before)),
+        )
+        older_times = array('d', (ts for ts, _ in rows))
+        older_levels = array('h', (-1 if level is None else level for _, level in rows))
+        return older_times + times, older_levels + levels
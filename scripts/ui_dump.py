@@ -0,0 +1,86 @@
+import argparse
+import io
+import time
+
+from lxml import etree
+
+TEXT_VIEW = "android.widget.TextView"
+
+
+# Text of every TextView in a uiautomator `dump_hierarchy` XML, in document
+# order (the order `device(className=...)` iterates them), stripped like
+# `element.get_text().strip()`. Parsed as a stream: each node is read when it
+# opens and freed when it closes, so the tree is never held in memory.
+def text_elements(xml, class_name=TEXT_VIEW):
+    if isinstance(xml, str):
+        xml = xml.encode('utf-8')
+    texts = []
+    for event, node in etree.iterparse(io.BytesIO(xml), events=("start", "end"), tag="node"):
+        if event == "start":
+            if node.get("class") == class_name:
+                texts.append((node.get("text") or "").strip())
+        else:
+            node.clear(keep_tail=True)
+    return texts
+
+
+# Pair up About-screen labels with the values that follow them
+def pair_key_value(elements):
+    info = {}
+    i = 0
+    while i < len(elements):
+        key = elements[i]
+        if i + 1 < len(elements):
+            value = elements[i + 1]
+            if ":" in key or key.endswith(":"):
+                # If a key appears with a colon or ends with a colon, skip it
+                i += 1
+                continue
+            if value in ["Front", "Rear"]:
+                # Handle special case for Cameras
+                camera_type = value
+                if i + 2 < len(elements):
+                    camera_value = elements[i + 2]
+                    info[f"Cameras {camera_type}"] = camera_value
+                    i += 3
+                else:
+                    i += 2
+            else:
+                # General key-value extraction
+                info[key] = value
+                i += 2
+        else:
+            i += 1
+    return info
+
+
+# Device facts from one dump of the About device screen
+def parse_about_screen(xml):
+    return pair_key_value(text_elements(xml))
+
+
+# Time parsing a saved dump. The per-element path this replaces made one RPC to
+# list the TextViews plus one `get_text()` per TextView; this path makes one.
+def benchmark(path, repeat=1000):
+    with open(path, 'rb') as dump:
+        xml = dump.read()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        info = parse_about_screen(xml)
+    elapsed = time.perf_counter() - started
+    texts = text_elements(xml)
+    print(f"{path}: {len(xml)} bytes, {len(texts)} TextViews, {len(info)} key/value pairs")
+    print(f"  parse: {elapsed / repeat * 1000:.3f} ms per dump (mean of {repeat} runs)")
+    print(f"  device round trips per sample: 1 (per-element path: {len(texts) + 1})")
+    return info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse or benchmark saved uiautomator hierarchy dumps")
+    parser.add_argument("dumps", nargs="+", help="dump_hierarchy XML files, e.g. ui_info/about_phone.xml")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    for path in args.dumps:
+        for key, value in benchmark(path, args.repeat).items():
+            print(f"  {key}: {value}")
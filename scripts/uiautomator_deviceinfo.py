@@ -1,13 +1,33 @@
-import uiautomator2 as u2
+import argparse
 import time
-import json
-from datetime import datetime
-import schedule
-
-# Function to run the automation script
-def run_automation_script():
+try:
+    import uiautomator2 as u2
+except ImportError:
+    u2 = None  # Only needed to open a connection; fleet.py --fake runs without it
+from battery_sampler import ShellError, ShellSession, read_battery, read_fingerprint
+from device_store import DeviceStore, device_key
+from ui_dump import parse_about_screen
+
+# adb serial of the phone to collect from
+SERIAL = 'c26d8eaa'
+
+# Seconds between battery samples over the persistent shell
+SAMPLE_INTERVAL = 1.0
+
+# Seconds between build-fingerprint checks; a changed fingerprint (OTA, reflash)
+# is the signal to re-read the static facts through the Settings UI
+FACTS_CHECK_INTERVAL = 600
+
+# Read the static facts (model, processor, RAM, ...) from Settings > About device.
+# This drives the phone's UI for several seconds, so it only runs when a device
+# has no cached facts or its build fingerprint changed. `device` is an open
+# uiautomator2 connection to reuse; otherwise one is made to `serial`.
+def capture_device_facts(serial=SERIAL, device=None):
     # Connect to the Android device
-    device = u2.connect('c26d8eaa')  # Automatically connect to the first available device
+    if device is None:
+        if u2 is None:
+            raise RuntimeError("Reading device facts needs uiautomator2 (pip install uiautomator2)")
+        device = u2.connect(serial)
 
     # Verify connection
     if device.info:
@@ -23,9 +43,6 @@ def run_automation_script():
     # Wait for the app to load
     time.sleep(2)
 
-    # Path to save the JSON file
-    json_file_path = 'device_info.json'
-
     # Dictionary to store extracted data
     device_info = {}
 
@@ -43,94 +60,80 @@ def run_automation_script():
         # Adding time to ensure the page loads completely
         time.sleep(3)
 
-        # Extract visible text elements
+        # Fetch the whole screen in one round trip and extract the text locally
         print("Extracting device information:")
-        text_elements = [element.get_text().strip() for element in device(className="android.widget.TextView")]
-
-        # Helper function to handle key-value pairs and multi-line entries
-        def pair_key_value(elements):
-            info = {}
-            i = 0
-            while i < len(elements):
-                key = elements[i]
-                if i + 1 < len(elements):
-                    value = elements[i + 1]
-                    if ":" in key or key.endswith(":"):
-                        # If a key appears with a colon or ends with a colon, skip it
-                        i += 1
-                        continue
-                    if value in ["Front", "Rear"]:
-                        # Handle special case for Cameras
-                        camera_type = value
-                        if i + 2 < len(elements):
-                            camera_value = elements[i + 2]
-                            info[f"Cameras {camera_type}"] = camera_value
-                            i += 3
-                        else:
-                            i += 2
-                    else:
-                        # General key-value extraction
-                        info[key] = value
-                        i += 2
-                else:
-                    i += 1
-            return info
-
-        # Process the extracted text elements
-        device_info = pair_key_value(text_elements)
-
-        # Get the current battery level
-        battery_info = device.shell('dumpsys battery | grep level').output.strip().split(": ")
-        if len(battery_info) > 1:
-            battery_level = battery_info[1]
-        else:
-            battery_level = "N/A"
-        device_info["Battery level"] = battery_level
-
-        # Get the current timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        device_info["Timestamp"] = timestamp
+        device_info = parse_about_screen(device.dump_hierarchy())
 
         # Print the extracted information in the terminal
         print("\nDevice Information:")
         for key, value in device_info.items():
             print(f"{key}: {value}")
 
-        # Load existing data from the JSON file, if any
-        try:
-            with open(json_file_path, 'r') as json_file:
-                data = json.load(json_file)
-
-                # If the data is a dictionary (from earlier runs), convert it to a list
-                if isinstance(data, dict):
-                    data = [data]
-
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = []
-
-        # Append the new device info to the list
-        data.append(device_info)
-
-        # Save the updated list to the JSON file
-        with open(json_file_path, 'w') as json_file:
-            json.dump(data, json_file, indent=4, ensure_ascii=False)
-
-        print("\nDevice information saved to 'device_info.json'")
-
     except Exception as e:
         print(f"Error: {e}")
+        device_info = None
 
     # Close the Settings app
     device.app_stop(app_package)
     print("App closed.")
-
-# Run the automation script immediately at startup
-run_automation_script()
-
-# Schedule the script to run every 1 minute
-schedule.every(1).minutes.do(run_automation_script)
-
-# Keep the script running
-while True:
-    schedule.run_pending()
-    time.sleep(1)
+    return device_info
+
+# Device id for `serial`, reusing the cached facts unless the build fingerprint
+# changed since they were read (or `force` is set)
+def ensure_device(shell, device_store, serial=SERIAL, force=False):
+    fingerprint = read_fingerprint(shell)
+    cached = device_store.device_for_serial(serial)
+    if cached and not force and cached[1].get("Build fingerprint") == fingerprint:
+        return cached[0]
+
+    facts = capture_device_facts(serial)
+    if facts is None:
+        if cached:
+            return cached[0]  # Keep sampling against the old facts; retried at the next check
+        raise ConnectionError(f"Could not read the device facts of {serial}")
+    facts["Build fingerprint"] = fingerprint
+    with device_store.conn:
+        device_id = device_store.upsert_device(device_key(facts, serial), facts, serial=serial)
+    print("Device facts saved to 'device_data.db'")
+    return device_id
+
+# Sample the battery every `interval` seconds over one persistent adb shell,
+# re-checking the static facts every `facts_check` seconds
+def run_collector(serial=SERIAL, interval=SAMPLE_INTERVAL, facts_check=FACTS_CHECK_INTERVAL):
+    # Readings are appended to device_data.db
+    device_store = DeviceStore()
+    shell = ShellSession(serial)
+    try:
+        device_id = ensure_device(shell, device_store, serial)
+        next_check = time.monotonic() + facts_check
+        while True:
+            started = time.monotonic()
+            try:
+                sample = read_battery(shell)
+                device_store.record_battery(device_id, sample)
+                print(f"Battery {sample['level']}% {sample['temperature']}C {sample['voltage']}mV "
+                      f"{sample['current']}uA {sample['status']} "
+                      f"({(time.monotonic() - started) * 1000:.0f} ms)")
+            except (ShellError, TimeoutError) as e:
+                print(f"Sample failed: {e}")
+            if started >= next_check:
+                next_check = time.monotonic() + facts_check
+                try:
+                    device_id = ensure_device(shell, device_store, serial)
+                except Exception as e:
+                    # uiautomator2 can fail in many ways; keep sampling against the old facts
+                    print(f"Facts check failed, retrying in {facts_check}s: {e}")
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        shell.close()
+        device_store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect device facts and battery telemetry from one phone")
+    parser.add_argument("--serial", default=SERIAL, help="adb serial of the device")
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="seconds between battery samples")
+    args = parser.parse_args()
+    try:
+        run_collector(args.serial, args.interval)
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,14 @@
-import requests
-import time
-import json
-import random
+import asyncio
 import urllib3
 import datetime
-import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+import zebpay_store
+from proxy_discovery import ProxyDiscovery
+from proxy_pool import ProxyPool
+from scheduler import PollSchedule, RateLimiter, TokenBucket
+from segment_log import SegmentLog
+from zeb_scraper import AsyncScraper
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -23,148 +27,180 @@ proxies = [
     {"https": "http://103.69.21.192:58080"}
 ]
 
+# Latency/success scores per proxy, kept across restarts
+PROXY_SCORES_FILE = "proxy_scores.json"
+
+# Health-ranked proxy pool with circuit breakers
+proxy_pool = ProxyPool(proxies, state_path=PROXY_SCORES_FILE)
+
 # ZebPay API endpoint (replace with actual endpoint)
 zebpay_api_url = "https://www.zebapi.com/pro/v1/market/"
 
+# Optional file of extra candidate proxies (one host:port per line), validated in the background
+PROXY_CANDIDATES_FILE = "proxy_candidates.txt"
+
+# How often (in seconds) candidates and pooled proxies are re-validated
+PROXY_VALIDATION_INTERVAL = 600
+
+# URL a candidate must fetch (as JSON) to count as working; point it at a cheaper
+# https endpoint to keep validation off the market API
+PROXY_VALIDATION_URL = zebpay_api_url
+
+# Token bucket of validation requests/sec (and burst), separate from the poll budget
+# below so a round of hundreds of candidates neither crawls nor delays the polls
+PROXY_VALIDATION_RATE = 20.0
+PROXY_VALIDATION_BURST = 200
+
 # Number of max retries for failed proxies
 MAX_RETRIES = 2
 
-# Delay between requests (in seconds)
-DELAY_BETWEEN_REQUESTS = 5
+# Requests in flight at once across all proxies
+MAX_CONCURRENT_REQUESTS = 8
+
+# Proxies raced per poll; the first good reply wins
+HEDGED_REQUESTS = 2
 
-# Number of requests allowed per proxy
-MAX_REQUESTS_PER_PROXY = 10
+# Timeouts (in seconds) for connecting to a proxy and for reading the reply
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
 
-# File to save the successful scraped data
-output_json_file = "zebpay_data.json"
+# Target cadence: one fresh market snapshot every POLL_INTERVAL seconds
+POLL_INTERVAL = 5
+
+# Token-bucket limits: requests/sec (and burst) to the API host across all proxies,
+# and per proxy
+HOST_RATE_LIMIT = 1.0
+HOST_BURST = 4
+PROXY_RATE_LIMIT = 0.2
+PROXY_BURST = 2
+
+# Raw replies are archived as NDJSON segments in this directory; a segment is
+# compressed once it reaches LOG_SEGMENT_BYTES or LOG_SEGMENT_AGE seconds
+output_log_dir = "zebpay_log"
+LOG_SEGMENT_BYTES = 16 * 1024 * 1024
+LOG_SEGMENT_AGE = 24 * 3600
 
 # Mobile User-Agent Header
 headers = {
     'User-Agent': 'Mozilla/5.0 (Linux; Android 10; SM-G950F Build/NRD90M; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/67.0.3396.87 Mobile Safari/537.36'
 }
 
-# SQLite DB connection setup
-conn = sqlite3.connect('zebpay_data.db')
-cursor = conn.cursor()
-
-# Create table if not exists
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS zebpay_data (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    market TEXT,
-    volumeEx REAL,
-    volumeQt REAL,
-    pricechange TEXT,
-    quickTradePrice TEXT,
-    pair TEXT,
-    virtualCurrency TEXT,
-    currency TEXT,
-    volume REAL
-)
-''')
-
-# Commit to save table creation
-conn.commit()
-
-# Function to save scraped data to the JSON file immediately
-def save_data_immediately(data):
+# Number of polls buffered into one database transaction
+POLLS_PER_COMMIT = 1
+
+# Store only the pairs that changed since the previous poll (plus a full keyframe
+# every KEYFRAME_INTERVAL seconds) instead of every pair on every poll. Opt-in:
+# tools that read zebpay_data directly only see the polls stored before it was
+# switched on; history from both modes is served by zebpay_store.reconstruct,
+# pair_history and the candles
+DELTA_STORAGE = False
+KEYFRAME_INTERVAL = 3600
+
+# Replies are archived and stored on this one thread, in arrival order, so segment
+# rotation (compressing up to LOG_SEGMENT_BYTES) and SQLite commits never stall
+# the event loop that runs the polls. The connection lives on this thread too.
+storage_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zeb-storage")
+
+# SQLite DB connection setup (creates or upgrades the schema)
+def open_writer():
+    conn = zebpay_store.connect('zebpay_data.db')
+    if DELTA_STORAGE:
+        return zebpay_store.DeltaWriter(conn, polls_per_commit=POLLS_PER_COMMIT, keyframe_interval=KEYFRAME_INTERVAL)
+    return zebpay_store.SnapshotWriter(conn, polls_per_commit=POLLS_PER_COMMIT)
+
+writer = storage_thread.submit(open_writer).result()
+
+# Append-only archive of every raw reply (read back with segment_log.read_records)
+raw_log = SegmentLog(output_log_dir, prefix="zebpay", max_bytes=LOG_SEGMENT_BYTES, max_age=LOG_SEGMENT_AGE)
+
+# Function to save scraped data to the raw log immediately
+def save_data_immediately(data, fetched_at):
     try:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        timestamp = datetime.datetime.fromtimestamp(fetched_at).strftime("%Y-%m-%d %H:%M:%S")
         data["timestamp"] = timestamp  # Add timestamp for better tracking
-        with open(output_json_file, 'a') as outfile:
-            json.dump(data, outfile, indent=4)
-            outfile.write("\n")  # Newline for better readability
-            print(f"Data saved to {output_json_file} at {timestamp}")
+        size = raw_log.append(data)
+        print(f"Data saved to {output_log_dir} at {timestamp} ({size:,} bytes)")
     except Exception as e:
         print(f"Error while saving the data: {str(e)}")
 
-# Function to insert or update data into the SQLite database
-def insert_data_into_db(data):
+# Function to insert data into the SQLite database and refresh the latest quote per pair
+def insert_data_into_db(data, fetched_at):
     try:
-        for record in data["response"]:
-            cursor.execute('''
-                INSERT INTO zebpay_data (
-                    market, volumeEx, volumeQt, pricechange, quickTradePrice, pair, virtualCurrency, currency, volume
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                record.get('market'),
-                record.get('volumeEx', 0),
-                record.get('volumeQt', 0),
-                record.get('pricechange'),
-                record.get('quickTradePrice'),
-                record.get('pair'),
-                record.get('virtualCurrency'),
-                record.get('currency'),
-                record.get('volume', 0)
-            ))
-
-        # Commit the transaction
-        conn.commit()
-        print("Data inserted into database successfully.")
+        if writer.add(data["response"], fetched_at=int(fetched_at)):
+            print("Data inserted into database successfully.")
     except Exception as e:
         print(f"Error while inserting data into the database: {str(e)}")
 
-# Function to make a request using a proxy
-def make_request(proxy, url, retries=0):
-    try:
-        print(f"Using proxy: {proxy}")
-        response = requests.get(url, proxies=proxy, headers=headers, timeout=30, verify=False)
-        response.raise_for_status()
-
-        # Check if response is JSON
-        if 'application/json' in response.headers.get('Content-Type', ''):
-            response_json = response.json()
-            print(f"JSON Response from {url}: {response_json}")
-
-            # Save the successful request along with proxy IP details
-            data = {
-                "proxy": proxy,
-                "url": url,
-                "response": response_json
-            }
-
-            # Immediately save to file
-            save_data_immediately(data)
-
-            # Insert data into SQLite database
-            insert_data_into_db(data)
-
-            return True
-        else:
-            print(f"Non-JSON response from {url}: {response.text}")
-            return False
-
-    except requests.RequestException as e:
-        print(f"Error with {proxy}, skipping...: {str(e)}")
-        if retries < MAX_RETRIES:
-            print(f"Retrying... (Attempt {retries + 1}/{MAX_RETRIES})")
-            return make_request(proxy, url, retries=retries + 1)
-        return False
-
-# Main function to rotate proxies and make requests
+# Runs on storage_thread
+def store_response(data, fetched_at):
+    save_data_immediately(data, fetched_at)
+    insert_data_into_db(data, fetched_at)
+
+# Function to handle a successful JSON reply from the hedged scraper; called on
+# the event loop, so the disk work is handed to storage_thread
+def handle_response(proxy, response_json, latency):
+    print(f"JSON Response from {zebpay_api_url} via {proxy} in {latency * 1000:.0f} ms")
+
+    # Save the successful request along with proxy IP details
+    data = {
+        "proxy": proxy,
+        "url": zebpay_api_url,
+        "response": response_json
+    }
+
+    # Archive it and insert it into SQLite, stamped with the time it arrived
+    storage_thread.submit(store_response, data, time.time())
+
+# Flush what is still queued or buffered, then close the log and the writer
+def close_storage():
+    storage_thread.submit(writer.close).result()
+    storage_thread.submit(raw_log.close).result()
+    storage_thread.shutdown()
+
+# Main function: poll the API continuously through the proxies until interrupted
 def rotate_proxies_and_scrape():
-    # Dictionary to track requests made per proxy
-    request_count = {proxy["https"]: 0 for proxy in proxies}
-
-    while any(count < MAX_REQUESTS_PER_PROXY for count in request_count.values()):
-        random.shuffle(proxies)  # Shuffle the proxies list to randomize selection
-        for proxy in proxies:
-            proxy_key = proxy["https"]
-            if request_count[proxy_key] >= MAX_REQUESTS_PER_PROXY:
-                print(f"Max requests reached for {proxy}, moving to next proxy.")
-                continue
-
-            success = make_request(proxy, zebpay_api_url)
-            if success:
-                request_count[proxy_key] += 1
-
-            # Delay between requests to prevent overwhelming the proxy or server
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-
-            # Break the loop if we've reached the max requests for this proxy
-            if request_count[proxy_key] >= MAX_REQUESTS_PER_PROXY:
-                break
+    # The polls' budget for the API host; validation gets a bucket of its own
+    limiter = RateLimiter(HOST_RATE_LIMIT, HOST_BURST, PROXY_RATE_LIMIT, PROXY_BURST)
+    discovery = ProxyDiscovery(
+        proxy_pool,
+        PROXY_CANDIDATES_FILE,
+        PROXY_VALIDATION_URL,
+        interval=PROXY_VALIDATION_INTERVAL,
+        bucket=TokenBucket(PROXY_VALIDATION_RATE, PROXY_VALIDATION_BURST),
+        connect_timeout=CONNECT_TIMEOUT,
+        read_timeout=READ_TIMEOUT,
+        headers=headers,
+    )
+    discovery.start()
+
+    scraper = AsyncScraper(
+        proxy_pool,
+        zebpay_api_url,
+        on_response=handle_response,
+        headers=headers,
+        concurrency=MAX_CONCURRENT_REQUESTS,
+        hedge=HEDGED_REQUESTS,
+        attempts=MAX_RETRIES + 1,
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        limiter=limiter,
+    )
+    schedule = PollSchedule(POLL_INTERVAL)
+    try:
+        asyncio.run(scraper.run(schedule))
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        discovery.stop()
+        scraper.close()
+        print(f"Scraper stats: {scraper.stats()}")
+        print(f"Schedule stats: {schedule.stats()}")
+        for health in proxy_pool.stats():
+            print(f"Proxy {health['proxy']}: {health}")
 
 # Entry point for the script
 if __name__ == "__main__":
-    rotate_proxies_and_scrape()
+    try:
+        rotate_proxies_and_scrape()
+    finally:
+        close_storage()
+        print(f"Ingestion stats: {writer.stats()}")
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class FetchError(Exception):
+    pass
+
+
+def _discard(task):
+    if not task.cancelled():
+        task.exception()
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class ProxyClient:
+    """Keep-alive session for one proxy.
+
+    requests keeps the TCP/TLS connection to the proxy in the adapter's pool, so
+    repeated polls through the same proxy skip the connect and handshake.
+    """
+
+    def __init__(self, proxy, headers=None, pool_size=4, timeout=(5, 10), verify=False):
+        self.proxy = proxy
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.proxies.update(proxy)
+        self.session.verify = verify
+        if headers:
+            self.session.headers.update(headers)
+
+    # Blocking fetch; returns the decoded JSON body or raises FetchError
+    def fetch(self, url):
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise FetchError(str(e)) from e
+        if 'application/json' not in response.headers.get('Content-Type', ''):
+            raise FetchError(f"Non-JSON response: {response.text[:200]}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise FetchError(f"Invalid JSON: {e}") from e
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncScraper:
+    """Concurrent, hedged polling of one URL through a `ProxyPool`.
+
+    Every poll races the `hedge` best-ranked proxies and keeps the first good
+    reply, feeding each outcome back into the pool's health scores, so a poll
+    takes as long as the fastest proxy rather than the slowest. Requests run on a
+    thread pool of `concurrency` workers, which is the global cap on requests in
+    flight; losers of a race run to completion (bounded by the timeouts) so slow
+    proxies are still scored.
+    `on_response(proxy, payload, latency)` is called on the event loop thread for
+    every poll that succeeds, so it should hand any disk work to another thread.
+    With a `RateLimiter` every request waits for a host token and throttled
+    proxies are skipped in favour of the next best ones.
+    """
+
+    def __init__(self, pool, url, on_response, headers=None, concurrency=8, hedge=2,
+                 attempts=3, timeout=(5, 10), limiter=None):
+        self.pool = pool
+        self.limiter = limiter
+        self.url = url
+        self.on_response = on_response
+        self.headers = headers
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.hedge = hedge
+        self.attempts = attempts
+        self.clients = {}
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="scrape")
+        self.latencies = []
+        self.successes = 0
+        self.failures = 0
+
+    # Sessions are created on first use, so proxies added to the pool later just work
+    def client(self, proxy):
+        key = self.pool.key(proxy)
+        if key not in self.clients:
+            self.clients[key] = ProxyClient(proxy, headers=self.headers, timeout=self.timeout)
+        return self.clients[key]
+
+    async def _attempt(self, proxy):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        latency = None
+        failed = False
+        try:
+            payload = await loop.run_in_executor(self._executor, self.client(proxy).fetch, self.url)
+            latency = time.perf_counter() - started
+            return proxy, payload, latency
+        except Exception as e:
+            # FetchError, but also anything unexpected from the session or decoder
+            failed = True
+            self.failures += 1
+            print(f"Error with {proxy}, skipping...: {e}")
+            raise
+        finally:
+            # Every way out settles the proxy, so a half-open probe is never left claimed
+            if latency is not None:
+                self.pool.record_success(proxy, latency)
+            elif failed:
+                self.pool.record_failure(proxy)
+            else:
+                self.pool.release(proxy)  # Cancelled before an outcome
+
+    # Best proxies for the next attempt that still have rate-limit tokens; waits for
+    # a throttled proxy to refill rather than giving up while healthy ones exist
+    async def _pick(self, exclude):
+        if self.limiter is None:
+            return self.pool.pick(self.hedge, exclude=exclude)
+        excluded = {self.pool.key(proxy) for proxy in exclude}
+        while True:
+            available = [proxy for proxy in self.pool.all() if self.pool.key(proxy) not in excluded]
+            throttled = set(self.limiter.throttled([self.pool.key(proxy) for proxy in available]))
+            proxies = self.pool.pick(
+                self.hedge,
+                exclude=list(exclude) + [proxy for proxy in available if self.pool.key(proxy) in throttled],
+            )
+            if proxies:
+                self.limiter.take([self.pool.key(proxy) for proxy in proxies])
+                try:
+                    for _ in proxies:
+                        await self.limiter.host.acquire()
+                except asyncio.CancelledError:
+                    for proxy in proxies:
+                        self.pool.release(proxy)
+                    raise
+                return proxies
+            if not throttled:
+                return []
+            await asyncio.sleep(self.limiter.next_ready(list(throttled)))
+
+    # One hedged poll; returns (proxy, payload, latency) or None if every attempt failed
+    async def poll(self):
+        tried = []
+        for _ in range(self.attempts):
+            proxies = await self._pick(tried)
+            if not proxies:
+                print("No healthy proxies available for this poll.")
+                break
+            tried.extend(proxies)
+            pending = {asyncio.ensure_future(self._attempt(proxy)) for proxy in proxies}
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    winners = [task.result() for task in done if task.exception() is None]
+                    if winners:
+                        proxy, payload, latency = winners[0]
+                        self.successes += 1
+                        self.latencies.append(latency)
+                        self.on_response(proxy, payload, latency)
+                        return winners[0]
+            finally:
+                # Losing requests are left to finish so their outcome still
+                # updates the proxy scores; their payloads are discarded
+                for task in pending:
+                    task.add_done_callback(_discard)
+        return None
+
+    # Run `total` polls with up to `parallel` of them in flight at once; each
+    # worker waits `interval` seconds after a poll before starting its next one
+    async def scrape(self, total, parallel=2, interval=0):
+        queue = asyncio.Queue()
+        for _ in range(total):
+            queue.put_nowait(None)
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                await self.poll()
+                if interval and not queue.empty():
+                    await asyncio.sleep(interval)
+
+        await asyncio.gather(*(worker() for _ in range(parallel)))
+
+    # Poll forever on the cadence of a `PollSchedule`
+    async def run(self, schedule):
+        while True:
+            started = await schedule.wait()
+            result = await self.poll()
+            schedule.record(started, result is not None)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            "max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for client in self.clients.values():
+            client.close()
+        self.pool.save()
@@ -0,0 +1,521 @@
+import sqlite3
+import time
+
+from db import apply_migrations
+
+DB_NAME = "zebpay_data.db"
+
+
+def _add_numeric_columns(conn):
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(zebpay_data)')}
+    for name, kind in (
+        ("fetched_at", "INTEGER"),
+        ("market_price", "REAL"),
+        ("price_change", "REAL"),
+        ("quick_trade_price", "REAL"),
+    ):
+        if name not in columns:
+            conn.execute(f'ALTER TABLE zebpay_data ADD COLUMN {name} {kind}')
+
+    # Backfill the numeric copies of the TEXT prices; rows scraped before this
+    # migration have no fetch time, so fetched_at stays NULL for them
+    conn.execute('''
+        UPDATE zebpay_data SET
+            market_price = CAST(market AS REAL),
+            price_change = CAST(pricechange AS REAL),
+            quick_trade_price = CAST(quickTradePrice AS REAL)
+        WHERE market_price IS NULL
+    ''')
+
+
+# Candle widths kept per pair, in seconds
+CANDLE_WIDTHS = {"1m": 60, "5m": 300, "1h": 3600, "1d": 86400}
+
+
+# Fold one quote into the in-memory candles keyed (pair, width, start); each value
+# is [open, high, low, close, volume, samples, first_at, last_at]
+def fold_candle(candles, pair, fetched_at, price, volume):
+    for width in CANDLE_WIDTHS.values():
+        key = (pair, width, fetched_at - fetched_at % width)
+        candle = candles.get(key)
+        if candle is None:
+            candles[key] = [price, price, price, price, volume, 1, fetched_at, fetched_at]
+            continue
+        if fetched_at < candle[6]:
+            candle[0], candle[6] = price, fetched_at
+        if fetched_at >= candle[7]:
+            candle[3], candle[4], candle[7] = price, volume, fetched_at
+        candle[1] = max(candle[1], price)
+        candle[2] = min(candle[2], price)
+        candle[5] += 1
+
+
+def candle_rows(candles):
+    return [key + tuple(candle) for key, candle in candles.items()]
+
+
+# Build the candles for snapshots stored before the candle table existed
+def _backfill_candles(conn):
+    candles = {}
+    for pair, fetched_at, price, volume in conn.execute('''
+        SELECT pair, fetched_at, COALESCE(quick_trade_price, market_price), volume
+        FROM zebpay_data
+        WHERE pair IS NOT NULL AND fetched_at IS NOT NULL
+          AND COALESCE(quick_trade_price, market_price) IS NOT NULL
+    '''):
+        fold_candle(candles, pair, fetched_at, price, volume)
+    conn.executemany(CANDLE_UPSERT, candle_rows(candles))
+
+
+# Schema history for zebpay_data.db; PRAGMA user_version tracks what has run
+MIGRATIONS = [
+    # The original snapshot table
+    '''
+    CREATE TABLE IF NOT EXISTS zebpay_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        market TEXT,
+        volumeEx REAL,
+        volumeQt REAL,
+        pricechange TEXT,
+        quickTradePrice TEXT,
+        pair TEXT,
+        virtualCurrency TEXT,
+        currency TEXT,
+        volume REAL
+    )
+    ''',
+    # Fetch time and numeric prices, indexed for per-pair history
+    _add_numeric_columns,
+    '''
+    CREATE INDEX IF NOT EXISTS idx_zebpay_data_pair_fetched ON zebpay_data (pair, fetched_at);
+    CREATE INDEX IF NOT EXISTS idx_zebpay_data_fetched ON zebpay_data (fetched_at)
+    ''',
+    # Latest quote per pair, kept current by UPSERT on every insert
+    '''
+    CREATE TABLE IF NOT EXISTS zebpay_latest (
+        pair TEXT PRIMARY KEY,
+        market TEXT,
+        volumeEx REAL,
+        volumeQt REAL,
+        pricechange TEXT,
+        quickTradePrice TEXT,
+        virtualCurrency TEXT,
+        currency TEXT,
+        volume REAL,
+        market_price REAL,
+        price_change REAL,
+        quick_trade_price REAL,
+        fetched_at INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_zebpay_latest_fetched ON zebpay_latest (fetched_at);
+    INSERT OR REPLACE INTO zebpay_latest (
+        pair, market, volumeEx, volumeQt, pricechange, quickTradePrice, virtualCurrency,
+        currency, volume, market_price, price_change, quick_trade_price, fetched_at
+    )
+    SELECT pair, market, volumeEx, volumeQt, pricechange, quickTradePrice, virtualCurrency,
+           currency, volume, market_price, price_change, quick_trade_price, fetched_at
+    FROM zebpay_data
+    WHERE id IN (SELECT MAX(id) FROM zebpay_data WHERE pair IS NOT NULL GROUP BY pair)
+    ''',
+    # Change-only storage: one row per poll that changed anything, one row per
+    # changed (or removed) pair, and every pair on keyframe polls
+    '''
+    CREATE TABLE IF NOT EXISTS zebpay_polls (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fetched_at INTEGER NOT NULL,
+        keyframe INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_zebpay_polls_fetched ON zebpay_polls (fetched_at);
+    CREATE INDEX IF NOT EXISTS idx_zebpay_polls_keyframe ON zebpay_polls (keyframe, fetched_at);
+    CREATE TABLE IF NOT EXISTS zebpay_changes (
+        poll_id INTEGER NOT NULL REFERENCES zebpay_polls (id),
+        pair TEXT NOT NULL,
+        removed INTEGER NOT NULL DEFAULT 0,
+        market TEXT,
+        volumeEx REAL,
+        volumeQt REAL,
+        pricechange TEXT,
+        quickTradePrice TEXT,
+        virtualCurrency TEXT,
+        currency TEXT,
+        volume REAL,
+        market_price REAL,
+        price_change REAL,
+        quick_trade_price REAL,
+        PRIMARY KEY (poll_id, pair)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_zebpay_changes_pair ON zebpay_changes (pair, poll_id)
+    ''',
+    # OHLCV candles per pair and width, folded in as snapshots arrive. `volume` is
+    # the API's rolling 24h volume as of the candle's last quote.
+    '''
+    CREATE TABLE IF NOT EXISTS zebpay_candles (
+        pair TEXT NOT NULL,
+        width INTEGER NOT NULL,
+        start INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,
+        samples INTEGER NOT NULL,
+        first_at INTEGER NOT NULL,
+        last_at INTEGER NOT NULL,
+        PRIMARY KEY (pair, width, start)
+    ) WITHOUT ROWID
+    ''',
+    _backfill_candles,
+]
+
+SNAPSHOT_INSERT = '''
+    INSERT INTO zebpay_data (
+        market, volumeEx, volumeQt, pricechange, quickTradePrice, pair, virtualCurrency, currency, volume,
+        market_price, price_change, quick_trade_price, fetched_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+LATEST_UPSERT = '''
+    INSERT INTO zebpay_latest (
+        market, volumeEx, volumeQt, pricechange, quickTradePrice, pair, virtualCurrency, currency, volume,
+        market_price, price_change, quick_trade_price, fetched_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(pair) DO UPDATE SET
+        market = excluded.market,
+        volumeEx = excluded.volumeEx,
+        volumeQt = excluded.volumeQt,
+        pricechange = excluded.pricechange,
+        quickTradePrice = excluded.quickTradePrice,
+        virtualCurrency = excluded.virtualCurrency,
+        currency = excluded.currency,
+        volume = excluded.volume,
+        market_price = excluded.market_price,
+        price_change = excluded.price_change,
+        quick_trade_price = excluded.quick_trade_price,
+        fetched_at = excluded.fetched_at
+    WHERE excluded.fetched_at >= zebpay_latest.fetched_at OR zebpay_latest.fetched_at IS NULL
+'''
+
+
+# Merge a partial candle into the stored one; open/close follow the earliest and
+# latest quote even if polls are flushed out of order
+CANDLE_UPSERT = '''
+    INSERT INTO zebpay_candles (pair, width, start, open, high, low, close, volume, samples, first_at, last_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(pair, width, start) DO UPDATE SET
+        open = CASE WHEN excluded.first_at < first_at THEN excluded.open ELSE open END,
+        high = MAX(high, excluded.high),
+        low = MIN(low, excluded.low),
+        close = CASE WHEN excluded.last_at >= last_at THEN excluded.close ELSE close END,
+        volume = CASE WHEN excluded.last_at >= last_at THEN excluded.volume ELSE volume END,
+        samples = samples + excluded.samples,
+        first_at = MIN(first_at, excluded.first_at),
+        last_at = MAX(last_at, excluded.last_at)
+'''
+
+POLL_INSERT = 'INSERT INTO zebpay_polls (fetched_at, keyframe) VALUES (?, ?)'
+
+CHANGE_INSERT = '''
+    INSERT INTO zebpay_changes (
+        poll_id, pair, removed, market, volumeEx, volumeQt, pricechange, quickTradePrice,
+        virtualCurrency, currency, volume, market_price, price_change, quick_trade_price
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Fields of a snapshot_row that make up a pair's state, in CHANGE_INSERT order
+# (everything but the pair itself and the fetch time)
+STATE_FIELDS = (0, 1, 2, 3, 4, 6, 7, 8, 9, 10, 11)
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# One zebpay_data row for an API record, in SNAPSHOT_INSERT column order
+def snapshot_row(record, fetched_at):
+    return (
+        record.get('market'),
+        record.get('volumeEx', 0),
+        record.get('volumeQt', 0),
+        record.get('pricechange'),
+        record.get('quickTradePrice'),
+        record.get('pair'),
+        record.get('virtualCurrency'),
+        record.get('currency'),
+        record.get('volume', 0),
+        to_float(record.get('market')),
+        to_float(record.get('pricechange')),
+        to_float(record.get('quickTradePrice')),
+        fetched_at,
+    )
+
+
+def connect(path=DB_NAME):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    apply_migrations(conn, MIGRATIONS)
+    return conn
+
+
+class SnapshotWriter:
+    """Batched ingestion of market responses into zebpay_data.db.
+
+    Each call to `add` buffers one poll. Buffered polls are written with one
+    `executemany` per table inside a single explicit transaction, once
+    `polls_per_commit` polls are waiting or the oldest has waited `max_delay`
+    seconds. With WAL and synchronous=NORMAL a commit costs one WAL append rather
+    than a full fsync of the database. Every quote is also folded into the
+    per-pair OHLCV candles in memory, so a flush upserts one row per pair and
+    width touched instead of re-aggregating history.
+    """
+
+    def __init__(self, conn, polls_per_commit=1, max_delay=30.0):
+        self.conn = conn
+        self.polls_per_commit = polls_per_commit
+        self.max_delay = max_delay
+        self._pending = []
+        self._candles = {}
+        self._first_buffered = None
+        self.total_rows = 0
+        self.total_seconds = 0.0
+        self.last_rate = 0.0
+
+    # What to keep of one poll until the next flush
+    def _encode(self, records, fetched_at):
+        return [snapshot_row(record, fetched_at) for record in records]
+
+    def add(self, records, fetched_at=None):
+        fetched_at = int(time.time()) if fetched_at is None else fetched_at
+        self._pending.append(self._encode(records, fetched_at))
+        for record in records:
+            price = to_float(record.get('quickTradePrice'))
+            if price is None:
+                price = to_float(record.get('market'))
+            if record.get('pair') and price is not None:
+                fold_candle(self._candles, record['pair'], fetched_at, price, to_float(record.get('volume')))
+        if self._first_buffered is None:
+            self._first_buffered = time.monotonic()
+        if (len(self._pending) >= self.polls_per_commit
+                or time.monotonic() - self._first_buffered >= self.max_delay):
+            return self.flush()
+        return 0
+
+    # Write the buffered polls inside the open transaction; returns (rows written,
+    # newest snapshot_row per pair for zebpay_latest)
+    def _write(self, pending):
+        rows = [row for poll in pending for row in poll]
+        self.conn.executemany(SNAPSHOT_INSERT, rows)
+        return len(rows), rows
+
+    def flush(self):
+        pending = self._pending
+        if not any(pending) and not self._candles:
+            self._pending = []
+            self._first_buffered = None
+            return 0
+
+        started = time.perf_counter()
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self.conn.execute('BEGIN')
+        try:
+            written, rows = self._write(pending)
+            # Only the newest row per pair matters for the latest-quote table
+            latest = {}
+            for row in rows:
+                if row[5]:
+                    latest[row[5]] = row
+            self.conn.executemany(LATEST_UPSERT, latest.values())
+            self.conn.executemany(CANDLE_UPSERT, candle_rows(self._candles))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        elapsed = time.perf_counter() - started
+
+        self._pending = []
+        self._candles = {}
+        self._first_buffered = None
+        self.total_rows += written
+        self.total_seconds += elapsed
+        self.last_rate = written / elapsed if elapsed else 0.0
+        print(f"Inserted {written} rows in {elapsed * 1000:.1f} ms ({self.last_rate:,.0f} rows/sec)")
+        return written
+
+    def stats(self):
+        return {
+            "rows": self.total_rows,
+            "seconds": round(self.total_seconds, 4),
+            "rows_per_sec": round(self.total_rows / self.total_seconds, 1) if self.total_seconds else 0.0,
+            "last_rows_per_sec": round(self.last_rate, 1),
+            "buffered_polls": len(self._pending),
+        }
+
+    def close(self):
+        self.flush()
+
+
+class DeltaWriter(SnapshotWriter):
+    """Change-only variant of `SnapshotWriter`.
+
+    Every poll is compared against the last known state of each pair kept in
+    memory; only pairs whose fields changed (or that vanished from the reply)
+    are written to zebpay_changes, so storage grows with market activity rather
+    than with the polling rate. A full keyframe of every pair is written on the
+    first poll and then every `keyframe_interval` seconds, which bounds how far
+    `reconstruct` has to replay. zebpay_latest is kept current as before.
+    """
+
+    def __init__(self, conn, polls_per_commit=1, max_delay=30.0, keyframe_interval=3600):
+        super().__init__(conn, polls_per_commit, max_delay)
+        self.keyframe_interval = keyframe_interval
+        self.state = {}
+        self._last_keyframe = None
+        self.rows_seen = 0
+
+    def _encode(self, records, fetched_at):
+        rows = {row[5]: row for row in (snapshot_row(record, fetched_at) for record in records) if row[5]}
+        self.rows_seen += len(rows)
+        if not rows:
+            # An empty reply says nothing about the market; don't mark every pair removed
+            return None
+        keyframe = self._last_keyframe is None or fetched_at - self._last_keyframe >= self.keyframe_interval
+        if keyframe:
+            self._last_keyframe = fetched_at
+        changed = []
+        latest = []
+        for pair, row in rows.items():
+            state = tuple(row[i] for i in STATE_FIELDS)
+            if keyframe or self.state.get(pair) != state:
+                changed.append((pair, 0) + state)
+                latest.append(row)
+            self.state[pair] = state
+        for pair in [pair for pair in self.state if pair not in rows]:
+            del self.state[pair]
+            if not keyframe:
+                changed.append((pair, 1) + (None,) * len(STATE_FIELDS))
+        if not changed:
+            return None
+        return fetched_at, keyframe, changed, latest
+
+    def _write(self, pending):
+        written = 0
+        latest = []
+        for poll in pending:
+            if poll is None:
+                continue
+            fetched_at, keyframe, changed, rows = poll
+            poll_id = self.conn.execute(POLL_INSERT, (fetched_at, int(keyframe))).lastrowid
+            self.conn.executemany(CHANGE_INSERT, [(poll_id,) + change for change in changed])
+            written += len(changed)
+            latest.extend(rows)
+        return written, latest
+
+    def stats(self):
+        stats = super().stats()
+        stats["rows_seen"] = self.rows_seen
+        stats["stored_fraction"] = round(self.total_rows / self.rows_seen, 4) if self.rows_seen else None
+        return stats
+
+
+# Keyframe to start replaying from, and the newest poll, for a given time
+RECONSTRUCT_BOUNDS_QUERY = '''
+    SELECT
+        (SELECT MAX(id) FROM zebpay_polls WHERE keyframe = 1 AND fetched_at <= :at),
+        (SELECT MAX(id) FROM zebpay_polls WHERE fetched_at <= :at),
+        (SELECT MAX(fetched_at) FROM zebpay_polls WHERE fetched_at <= :at),
+        (SELECT MAX(fetched_at) FROM zebpay_data WHERE fetched_at <= :at)
+'''
+
+# Every pair of the full snapshot taken at one time
+SNAPSHOT_AT_QUERY = '''
+    SELECT pair, market, volumeEx, volumeQt, pricechange, quickTradePrice,
+           virtualCurrency, currency, volume, market_price, price_change, quick_trade_price
+    FROM zebpay_data
+    WHERE fetched_at = ? AND pair IS NOT NULL
+'''
+
+RECONSTRUCT_QUERY = '''
+    SELECT pair, removed, market, volumeEx, volumeQt, pricechange, quickTradePrice,
+           virtualCurrency, currency, volume, market_price, price_change, quick_trade_price
+    FROM zebpay_changes
+    WHERE poll_id BETWEEN ? AND ?
+    ORDER BY poll_id
+'''
+
+STATE_COLUMNS = (
+    "market", "volumeEx", "volumeQt", "pricechange", "quickTradePrice", "virtualCurrency",
+    "currency", "volume", "market_price", "price_change", "quick_trade_price",
+)
+
+
+# Full market state (pair -> quote dict) as it was at epoch time `at`, rebuilt
+# from the newest keyframe at or before `at` plus the changes after it, or read
+# from the full snapshots when they are newer (DELTA_STORAGE off, or switched off)
+def reconstruct(conn, at):
+    start, end, polled_at, snapshot_at = conn.execute(RECONSTRUCT_BOUNDS_QUERY, {"at": int(at)}).fetchone()
+    if snapshot_at is not None and (polled_at is None or snapshot_at >= polled_at):
+        return {
+            pair: dict(zip(STATE_COLUMNS, values), pair=pair)
+            for pair, *values in conn.execute(SNAPSHOT_AT_QUERY, (snapshot_at,))
+        }
+    if start is None:
+        return {}
+    market = {}
+    for pair, removed, *values in conn.execute(RECONSTRUCT_QUERY, (start, end)):
+        if removed:
+            market.pop(pair, None)
+        else:
+            market[pair] = dict(zip(STATE_COLUMNS, values), pair=pair)
+    return market
+
+
+# Quotes for one pair with start <= fetched_at < end, oldest first, from both the
+# full snapshots and the change log (where a quote holds until its next change).
+# The quote in force at `start` from the change log (the pair's newest change or
+# keyframe before it, unless that removed the pair) is reported at `start`,
+# as `reconstruct` would see it, unless the pair changed at exactly `start`.
+PAIR_HISTORY_QUERY = '''
+    SELECT fetched_at, quick_trade_price, price_change, volume
+    FROM zebpay_data
+    WHERE pair = :pair AND fetched_at >= :start AND fetched_at < :end
+    UNION ALL
+    SELECT :start, quick_trade_price, price_change, volume
+    FROM zebpay_changes
+    WHERE pair = :pair AND removed = 0 AND :start < :end
+      AND poll_id = (
+          SELECT MAX(poll_id) FROM zebpay_changes
+          WHERE pair = :pair AND poll_id <= (SELECT MAX(id) FROM zebpay_polls WHERE fetched_at < :start)
+      )
+      AND NOT EXISTS (
+          SELECT 1 FROM zebpay_changes
+          WHERE pair = :pair AND poll_id IN (SELECT id FROM zebpay_polls WHERE fetched_at = :start)
+      )
+    UNION ALL
+    SELECT p.fetched_at, c.quick_trade_price, c.price_change, c.volume
+    FROM zebpay_changes c JOIN zebpay_polls p ON p.id = c.poll_id
+    WHERE c.pair = :pair AND c.removed = 0
+      AND c.poll_id >= (SELECT MIN(id) FROM zebpay_polls WHERE fetched_at >= :start)
+      AND c.poll_id <= (SELECT MAX(id) FROM zebpay_polls WHERE fetched_at < :end)
+    ORDER BY 1
+'''
+
+
+def pair_history(conn, pair, start, end):
+    return conn.execute(PAIR_HISTORY_QUERY, {"pair": pair, "start": int(start), "end": int(end)}).fetchall()
+
+
+# Candles for one pair and width (seconds) with start <= candle start < end
+CANDLE_QUERY = '''
+    SELECT start, open, high, low, close, volume
+    FROM zebpay_candles
+    WHERE pair = ? AND width = ? AND start >= ? AND start < ?
+    ORDER BY start
+'''
+
+
+def candles(conn, pair, width, start, end):
+    return conn.execute(CANDLE_QUERY, (pair, width, int(start), int(end))).fetchall()
@@ -0,0 +1,109 @@
+import threading
+import time
+import types
+
+import pytest
+
+import uiautomator_deviceinfo
+from device_store import DeviceStore
+from fake_devices import FakeBackend, FakeProfile
+from fleet import FleetCollector
+
+
+@pytest.fixture(autouse=True)
+def instant_settings_ui(monkeypatch):
+    # capture_device_facts waits seconds for the Settings UI to settle; fakes don't need it
+    monkeypatch.setattr(uiautomator_deviceinfo, "time", types.SimpleNamespace(
+        sleep=lambda seconds: None, monotonic=time.monotonic,
+    ))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DeviceStore(str(tmp_path / "device_data.db"))
+    yield store
+    store.close()
+
+
+def readings_per_serial(store):
+    return dict(store.conn.execute('''
+        SELECT d.device_key, COUNT(r.id) FROM devices d LEFT JOIN battery_readings r ON r.device_id = d.id
+        GROUP BY d.id
+    '''))
+
+
+def test_slow_hung_and_failing_devices_do_not_stall_the_rest(store):
+    backend = FakeBackend(6, timeout=0.5, profiles={
+        "fake00": FakeProfile(latency=1.0),
+        "fake01": FakeProfile(hang_rate=1.0),
+        "fake02": FakeProfile(failure_rate=1.0),
+    })
+    collector = FleetCollector(store, backend, workers=4, interval=0.1)
+
+    stats = collector.run(duration=3)
+
+    for serial in ("fake03", "fake04", "fake05"):
+        # 30 ticks in 3 s; the first one also reads the facts
+        assert stats[serial]["samples"] >= 20, stats[serial]
+        assert stats[serial]["failures"] == 0
+        assert stats[serial]["p99_ms"] < 500
+    # Hung and failing devices back off exponentially instead of retrying every tick
+    for serial in ("fake01", "fake02"):
+        assert stats[serial]["samples"] == 0
+        assert 1 <= stats[serial]["failures"] <= 6, stats[serial]
+        assert stats[serial]["consecutive_failures"] == stats[serial]["failures"]
+    assert "TimeoutError" in stats["fake01"]["last_error"]
+    assert "ShellError" in stats["fake02"]["last_error"]
+    # The slow device holds one worker and samples at its own pace
+    assert 1 <= stats["fake00"]["samples"] <= 3
+    assert stats["fake00"]["skipped"] > 0
+
+
+def test_readings_and_metrics_are_stored_under_each_serial(store):
+    backend = FakeBackend(3)
+    collector = FleetCollector(store, backend, workers=2, interval=0.2)
+
+    collector.run(duration=2.5)
+
+    devices = store.conn.execute('SELECT device_key, serial, model FROM devices ORDER BY device_key').fetchall()
+    assert devices == [("fake00", "fake00", "FK-00"), ("fake01", "fake01", "FK-01"), ("fake02", "fake02", "FK-02")]
+    # Readings are kept per second
+    assert all(count >= 2 for count in readings_per_serial(store).values())
+    metrics = store.conn.execute('''
+        SELECT d.device_key, m.samples, m.failures FROM device_metrics m JOIN devices d ON d.id = m.device_id
+        ORDER BY d.device_key
+    ''').fetchall()
+    assert [row[0] for row in metrics] == ["fake00", "fake01", "fake02"]
+    assert all(samples >= 10 and failures == 0 for _, samples, failures in metrics)
+    # One uiautomator2 connection per device, opened for the first facts read
+    assert backend.connects == 3
+
+
+def test_devices_attach_and_detach_while_running(store):
+    backend = FakeBackend(2)
+    collector = FleetCollector(store, backend, workers=2, interval=0.1, discover_interval=0.2)
+
+    def replug():
+        time.sleep(0.8)
+        backend.attached.remove("fake00")
+        backend.attached.append("fake07")
+
+    thread = threading.Thread(target=replug)
+    thread.start()
+    stats = collector.run(duration=2.5)
+    thread.join()
+
+    assert set(stats) == {"fake01", "fake07"}
+    assert stats["fake07"]["samples"] >= 5
+    assert set(readings_per_serial(store)) == {"fake00", "fake01", "fake07"}
+
+
+def test_known_devices_reuse_their_stored_facts(store):
+    FleetCollector(store, FakeBackend(2), interval=0.2).run(duration=1)
+
+    backend = FakeBackend(2)
+    FleetCollector(store, backend, interval=0.2).run(duration=1)
+
+    # Same serials and build fingerprints: the Settings UI isn't driven again
+    assert backend.connects == 0
+    assert len(store.conn.execute('SELECT id FROM devices').fetchall()) == 2
@@ -0,0 +1,111 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from proxy_discovery import ProxyDiscovery, validate_all
+from proxy_pool import ProxyPool
+from scheduler import TokenBucket
+
+TARGET = "http://market.test/pro/v1/market/"
+
+
+class FakeProxy(BaseHTTPRequestHandler):
+    """Answers every proxied GET itself, after the server's `delay`, with JSON
+    (or HTML when `json_reply` is off)."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        if self.server.json_reply:
+            body, content_type = json.dumps([{"pair": "BTC-INR"}]).encode(), "application/json"
+        else:
+            body, content_type = b"<html>blocked</html>", "text/html"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_proxies():
+    servers = []
+
+    def start(delay=0.0, json_reply=True):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeProxy)
+        server.delay = delay
+        server.json_reply = json_reply
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, {"http": f"http://127.0.0.1:{server.server_address[1]}"}
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def dead_proxy():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return {"http": f"http://127.0.0.1:{port}"}
+
+
+def test_validate_all_ranks_working_proxies_fastest_first(fake_proxies):
+    slow_server, slow = fake_proxies(delay=0.2)
+    _, fast = fake_proxies()
+    _, html = fake_proxies(json_reply=False)
+    dead = dead_proxy()
+
+    working, results = validate_all([slow, dead, html, fast], TARGET, connect_timeout=1, read_timeout=2)
+
+    assert [result["proxy"] for result in working] == [fast, slow]
+    assert len(results) == 4
+    assert working[1]["latency"] >= 0.2
+    assert all(result["bytes"] > 0 and result["throughput"] > 0 for result in working)
+    failed = {json.dumps(result["proxy"]): result["error"] for result in results if not result["ok"]}
+    assert set(failed) == {json.dumps(dead), json.dumps(html)}
+    # The fake proxy was asked for the target itself, as an absolute URI
+    assert slow_server.requests == [TARGET]
+
+
+def test_run_once_seeds_the_pool_and_evicts_dead_proxies(fake_proxies, tmp_path):
+    _, good = fake_proxies()
+    _, candidate = fake_proxies(delay=0.05)
+    dead = dead_proxy()
+    candidates_path = tmp_path / "proxy_candidates.txt"
+    candidates_path.write_text(candidate["http"].replace("http://", "") + "\n# comment\n")
+
+    pool = ProxyPool([good, dead])
+    discovery = ProxyDiscovery(pool, str(candidates_path), TARGET, evict_after=2, connect_timeout=1, read_timeout=2)
+
+    working = discovery.run_once()
+    assert [result["proxy"] for result in working] == [good, candidate]
+    assert candidate in pool.all()
+    assert dead in pool.all()
+    assert pool.health[dead["http"]].failures == 1
+
+    discovery.run_once()
+    assert dead not in pool.all()
+    assert sorted(proxy["http"] for proxy in pool.all()) == sorted([good["http"], candidate["http"]])
+
+
+def test_validation_takes_tokens_from_its_bucket(fake_proxies):
+    proxies = [fake_proxies()[1] for _ in range(3)]
+    pool = ProxyPool(proxies)
+    bucket = TokenBucket(rate=10.0, capacity=1)
+    discovery = ProxyDiscovery(pool, None, TARGET, bucket=bucket, connect_timeout=1, read_timeout=2)
+
+    started = time.monotonic()
+    assert len(discovery.run_once()) == 3
+    # One token up front, then two more at 10 per second
+    assert time.monotonic() - started >= 0.18